@@ -0,0 +1,472 @@
+from .aiodb import AsyncDatabase
+from .db import LazyInstance, prepared
+from .metrics import current_operation
+from . import queries, records
+from .api import (
+    PROPAGATED_ERRORS,
+    USER_CACHE, USER_IDENTITY_CACHE, CARD_CACHE, CATEGORY_CACHE, TEMPLATE_CACHE,
+    _cache_key, _invalidate, _card_amount_sql, _category_amount_sql, _check_money_status,
+    _distribution_params, _deposits_params, _deposits_result, _transactions_page_query, _transactions_page_result, _collect_params, _collect_summary,
+    IMPORT_ERRORS_LIMIT, _check_import_errors, _import_summary,
+)
+
+import functools
+import time
+
+"""
+Асинхронный вариант API для ASGI фронтенда: те же функции, что в api.py, с теми же аргументами и результатами,
+но это корутины (await aio.get_active_cards_by_owner_id(owner_id)), и соединение из пула не держит поток ОС на время запроса.
+Тексты запросов общие (queries.py), кэши и режим balance_mode - те же, что в api.py.
+
+Независимые запросы одного обработчика можно выполнять параллельно, каждый на своём соединении из пула:
+
+    cards, categories = await asyncio.gather(
+        aio.get_active_cards_by_owner_id(owner_id),
+        aio.get_active_categories_by_owner_id(owner_id),
+    )
+
+или на одном соединении за один round trip через ADB.fetch_many (pipeline-режим).
+Явная транзакция - ADB.transaction(), передаётся в функции аргументом tx, как DB.transaction() в api.py:
+
+    async with ADB.transaction() as tx:
+        await aio.add_subcard(card_id = 1, category_id = 2, description = "", tx = tx)
+        await aio.inc_money_to_subcard(card_id = 1, category_id = 2, inc_amount = 100, description = "", tx = tx)
+"""
+
+def try_return_none(func):
+    """
+    Декоратор корутины, возвращающий результат её выполнения или None при исключении.
+    PoolOverloadedError и ImportValidationError пробрасываются, как и в api.try_return_none.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = current_operation.set(func.__name__) # метка запросов к БД в метриках
+        try:
+            return await func(*args, **kwargs)
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception:
+            return None
+        finally:
+            current_operation.reset(token)
+    return wrapper
+
+def try_return_bool(func):
+    """
+    Декоратор корутины, возвращающий True или False в зависимости от наличия исключения при её выполнении.
+    PoolOverloadedError и ImportValidationError пробрасываются.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = current_operation.set(func.__name__) # метка запросов к БД в метриках
+        try:
+            await func(*args, **kwargs)
+            return True
+        except PROPAGATED_ERRORS:
+            raise
+        except Exception:
+            return False
+        finally:
+            current_operation.reset(token)
+    return wrapper
+
+def cached_by_id(cache):
+    """
+    Асинхронный вариант api.cached_by_id: кэши общие с синхронным API.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(entity_id, tx = None):
+            if tx is not None:
+                return await func(entity_id, tx = tx)
+            key = _cache_key(entity_id)
+            row = cache.get(key)
+            if row is None:
+                generation = cache.generation(key)
+                row = await func(entity_id)
+                cache.put(key, row, generation)
+            return row
+        return wrapper
+    return decorator
+
+ADB = LazyInstance(AsyncDatabase)
+
+def _db(tx):
+    """
+    Возвращает, через что выполнять запрос: переданную транзакцию или общий асинхронный пул.
+    """
+    return ADB if tx is None else tx
+
+@try_return_none
+async def add_user(*, tx = None, **kwargs):
+    """
+    Добавляет пользователя в БД. См. api.add_user.
+    """
+    return (await _db(tx).fetch_one_returning(queries.ADD_USER, params = kwargs))[0]
+
+@cached_by_id(USER_CACHE)
+@try_return_none
+async def get_user_by_id(user_id, tx = None):
+    """
+    Получает пользователя по id. См. api.get_user_by_id.
+    """
+    return await _db(tx).fetch_one(prepared(queries.GET_USER_BY_ID), params = {'id': user_id}, record = records.UserRecord)
+
+@cached_by_id(USER_IDENTITY_CACHE)
+@try_return_none
+async def get_user_identity_by_id(user_id, tx = None):
+    """
+    Получает данные пользователя для идентификации по id (без хеша и соли пароля). См. api.get_user_identity_by_id.
+    """
+    return await _db(tx).fetch_one(queries.GET_USER_IDENTITY_BY_ID, params = {'id': user_id}, record = records.UserIdentityRecord)
+
+@try_return_none
+async def get_user_by_login(login, tx = None):
+    """
+    Получает пользователя по логину. См. api.get_user_by_login.
+    """
+    return await _db(tx).fetch_one(queries.GET_USER_BY_LOGIN, params = {'login': login}, readonly = True, record = records.UserRecord)
+
+@try_return_none
+async def add_card(*, tx = None, **kwargs):
+    """
+    Добавляет карту в БД. См. api.add_card.
+    """
+    return (await _db(tx).fetch_one_returning(queries.ADD_CARD, params = kwargs))[0]
+
+@try_return_bool
+async def delete_card_by_id(card_id, tx = None):
+    """
+    Устанавливает is_active = False для карты по id. См. api.delete_card_by_id.
+    """
+    await _db(tx).execute(queries.DELETE_CARD_BY_ID, params = {'id': card_id})
+    _invalidate(CARD_CACHE, [card_id], tx)
+
+@try_return_none
+async def get_active_cards_by_owner_id(owner_id, tx = None):
+    """
+    Получает все активные карты пользователя. См. api.get_active_cards_by_owner_id.
+    """
+    return await _db(tx).fetch_all(prepared(queries.GET_ACTIVE_CARDS_BY_OWNER_ID.format(card_amount = _card_amount_sql())), params = {'owner_id': owner_id}, readonly = True, record = records.CardRecord)
+
+@try_return_none
+async def get_active_cards_overview_by_owner_id(owner_id, tx = None):
+    """
+    Получает все активные карты пользователя с субкартами и названиями категорий. См. api.get_active_cards_overview_by_owner_id.
+    """
+    return await _db(tx).fetch_all(queries.GET_ACTIVE_CARDS_OVERVIEW_BY_OWNER_ID.format(card_amount = _card_amount_sql("c")), params = {'owner_id': owner_id}, readonly = True, record = records.CardOverviewRowRecord)
+
+@try_return_none
+async def add_category(*, tx = None, **kwargs):
+    """
+    Добавляет категорию в БД. См. api.add_category.
+    """
+    return (await _db(tx).fetch_one_returning(queries.ADD_CATEGORY, params = kwargs))[0]
+
+@cached_by_id(CATEGORY_CACHE)
+@try_return_none
+async def get_category_by_id(category_id, tx = None):
+    """
+    Получает категорию по id. См. api.get_category_by_id.
+    """
+    return await _db(tx).fetch_one_returning(prepared(queries.GET_CATEGORY_BY_ID.format(category_amount = _category_amount_sql())), params = {'id': category_id}, record = records.CategoryRecord)
+
+@try_return_none
+async def get_categories_by_ids(category_ids, tx = None):
+    """
+    Получает несколько категорий одним запросом. См. api.get_categories_by_ids.
+    """
+    ids = sorted({int(category_id) for category_id in category_ids})
+    return await _db(tx).fetch_all(queries.GET_CATEGORIES_BY_IDS.format(category_amount = _category_amount_sql()), params = {'ids': ids}, readonly = True, record = records.CategoryRecord)
+
+@cached_by_id(CARD_CACHE)
+@try_return_none
+async def get_card_by_id(card_id, tx = None):
+    """
+    Получает карту по id. См. api.get_card_by_id.
+    """
+    return await _db(tx).fetch_one_returning(prepared(queries.GET_CARD_BY_ID.format(card_amount = _card_amount_sql())), params = {'id': card_id}, record = records.CardRecord)
+
+@try_return_none
+async def get_cards_by_ids(card_ids, tx = None):
+    """
+    Получает несколько карт одним запросом. См. api.get_cards_by_ids.
+    """
+    ids = sorted({int(card_id) for card_id in card_ids})
+    return await _db(tx).fetch_all(queries.GET_CARDS_BY_IDS.format(card_amount = _card_amount_sql()), params = {'ids': ids}, readonly = True, record = records.CardRecord)
+
+@try_return_none
+async def get_active_categories_by_owner_id(owner_id, tx = None):
+    """
+    Получает все активные категории пользователя. См. api.get_active_categories_by_owner_id.
+    """
+    return await _db(tx).fetch_all(queries.GET_ACTIVE_CATEGORIES_BY_OWNER_ID.format(category_amount = _category_amount_sql()), params = {'owner_id': owner_id}, readonly = True, record = records.CategoryRecord)
+
+@try_return_none
+async def add_subcard(*, tx = None, **kwargs):
+    """
+    Добавляет субкарту в БД. См. api.add_subcard.
+    """
+    return (await _db(tx).fetch_one_returning(queries.ADD_SUBCARD, params = kwargs))[0]
+
+@try_return_none
+async def get_subcard_by_card_id_and_category_id(*, tx = None, **kwargs):
+    """
+    Получает субкарту из БД. См. api.get_subcard_by_card_id_and_category_id.
+    """
+    return await _db(tx).fetch_one(prepared(queries.GET_SUBCARD_BY_CARD_ID_AND_CATEGORY_ID), params = kwargs, readonly = True, record = records.SubcardRecord)
+
+@try_return_bool
+async def inc_money_to_subcard(*, tx = None, **kwargs):
+    """
+    Добавляет деньги на субкарту в БД с занесением в логи. См. api.inc_money_to_subcard.
+    """
+    _check_money_status(await _db(tx).fetch_one(prepared(queries.INC_MONEY_TO_SUBCARD), params = kwargs), tx)
+    _invalidate(CARD_CACHE, [kwargs['card_id']], tx)
+    _invalidate(CATEGORY_CACHE, [kwargs['category_id']], tx)
+
+@try_return_bool
+async def dec_money_from_subcard(*, tx = None, **kwargs):
+    """
+    Вычитает деньги из субкарты в БД с занесением в логи. См. api.dec_money_from_subcard.
+    """
+    _check_money_status(await _db(tx).fetch_one(prepared(queries.DEC_MONEY_FROM_SUBCARD), params = kwargs), tx)
+    _invalidate(CARD_CACHE, [kwargs['card_id']], tx)
+    _invalidate(CATEGORY_CACHE, [kwargs['category_id']], tx)
+
+@try_return_bool
+async def inc_money_by_distribution(card_id, distribution, description, tx = None):
+    """
+    Зачисляет деньги на несколько субкарт одной карты одним запросом. См. api.inc_money_by_distribution.
+    """
+    params = _distribution_params(card_id, distribution, description)
+    await _db(tx).execute(queries.INC_MONEY_BY_DISTRIBUTION, params = params)
+    _invalidate(CARD_CACHE, [card_id], tx)
+    _invalidate(CATEGORY_CACHE, params['category_ids'], tx)
+
+@try_return_none
+async def inc_money_to_subcards(deposits, tx = None):
+    """
+    Зачисляет пачку денег на субкарты одним запросом. См. api.inc_money_to_subcards.
+    """
+    valid, params = _deposits_params(deposits)
+    rows = await _db(tx).fetch_all(queries.INC_MONEY_TO_SUBCARDS, params = params) if valid else []
+    return _deposits_result(deposits, valid, rows, tx)
+
+@try_return_none
+async def add_template(*, tx = None, **kwargs):
+    """
+    Добавляет шаблон в БД. См. api.add_template.
+    """
+    return (await _db(tx).fetch_one_returning(queries.ADD_TEMPLATE, params = kwargs))[0]
+
+@try_return_none
+async def get_templates_by_owner_id(owner_id, tx = None):
+    """
+    Получает все шаблоны пользователя. См. api.get_templates_by_owner_id.
+    """
+    return await _db(tx).fetch_all(queries.GET_TEMPLATES_BY_OWNER_ID, params = {'owner_id': owner_id}, readonly = True, record = records.TemplateRecord)
+
+@try_return_bool
+async def delete_template_by_id(template_id, tx = None):
+    """
+    Удаляет шаблон. См. api.delete_template_by_id.
+    """
+    await _db(tx).execute(queries.DELETE_TEMPLATE_BY_ID, params = {'id': template_id})
+    _invalidate(TEMPLATE_CACHE, [template_id], tx)
+
+@cached_by_id(TEMPLATE_CACHE)
+@try_return_none
+async def get_template_by_id(template_id, tx = None):
+    """
+    Получает шаблон. См. api.get_template_by_id.
+    """
+    return await _db(tx).fetch_one_returning(queries.GET_TEMPLATE_BY_ID, params = {'id': template_id}, record = records.TemplateRecord)
+
+@try_return_none
+async def get_templates_by_ids(template_ids, tx = None):
+    """
+    Получает несколько шаблонов одним запросом. См. api.get_templates_by_ids.
+    """
+    ids = sorted({int(template_id) for template_id in template_ids})
+    return await _db(tx).fetch_all(queries.GET_TEMPLATES_BY_IDS, params = {'ids': ids}, readonly = True, record = records.TemplateRecord)
+
+@try_return_bool
+async def change_template_by_id(*, tx = None, **kwargs):
+    """
+    Меняет шаблон в БД. См. api.change_template_by_id.
+    """
+    await _db(tx).execute(queries.CHANGE_TEMPLATE_BY_ID, params = kwargs)
+    _invalidate(TEMPLATE_CACHE, [kwargs['id']], tx)
+
+@try_return_bool
+async def change_user_by_id(*, tx = None, **kwargs):
+    """
+    Меняет пароль и/или имя пользователя в БД. См. api.change_user_by_id.
+    """
+    await _db(tx).execute(queries.CHANGE_USER_BY_ID, params = kwargs)
+    _invalidate(USER_CACHE, [kwargs['id']], tx)
+    _invalidate(USER_IDENTITY_CACHE, [kwargs['id']], tx)
+
+@try_return_none
+async def get_inactive_categories_by_owner_id(owner_id, tx = None):
+    """
+    Получает все неактивные категории пользователя. См. api.get_inactive_categories_by_owner_id.
+    """
+    return await _db(tx).fetch_all(queries.GET_INACTIVE_CATEGORIES_BY_OWNER_ID.format(category_amount = _category_amount_sql()), params = {'owner_id': owner_id}, readonly = True, record = records.CategoryRecord)
+
+@try_return_bool
+async def deactivate_category_by_id(category_id, tx = None):
+    """
+    'Удаляет' категорию (is_active = False). См. api.deactivate_category_by_id.
+    """
+    await _db(tx).execute(queries.DEACTIVATE_CATEGORY_BY_ID, params = {'id': category_id})
+    _invalidate(CATEGORY_CACHE, [category_id], tx)
+
+@try_return_bool
+async def reactivate_category_by_id(category_id, tx = None):
+    """
+    'Восстанавливает' категорию (is_active = True). См. api.reactivate_category_by_id.
+    """
+    await _db(tx).execute(queries.REACTIVATE_CATEGORY_BY_ID, params = {'id': category_id})
+    _invalidate(CATEGORY_CACHE, [category_id], tx)
+
+@try_return_bool
+async def change_category_by_id(*, tx = None, **kwargs):
+    """
+    Меняет имя и/или описание категории. См. api.change_category_by_id.
+    """
+    await _db(tx).execute(queries.CHANGE_CATEGORY_BY_ID, params = kwargs)
+    _invalidate(CATEGORY_CACHE, [kwargs['id']], tx)
+
+@try_return_bool
+async def change_card_by_id(*, tx = None, **kwargs):
+    """
+    Меняет имя и/или описание карты. См. api.change_card_by_id.
+    """
+    await _db(tx).execute(queries.CHANGE_CARD_BY_ID, params = kwargs)
+    _invalidate(CARD_CACHE, [kwargs['id']], tx)
+
+@try_return_bool
+async def deactivate_subcard_by_id(subcard_id, tx = None):
+    """
+    'Удаляет' субкарту (is_active = False). См. api.deactivate_subcard_by_id.
+    """
+    await _db(tx).execute(queries.DEACTIVATE_SUBCARD_BY_ID, params = {'id': subcard_id})
+
+@try_return_bool
+async def reactivate_subcard_by_id(subcard_id, tx = None):
+    """
+    'Восстанавливает' субкарту (is_active = True). См. api.reactivate_subcard_by_id.
+    """
+    await _db(tx).execute(queries.REACTIVATE_SUBCARD_BY_ID, params = {'id': subcard_id})
+
+@try_return_none
+async def get_active_subcards_by_card_id(card_id, tx = None):
+    """
+    Получает все активные субкарты на карте. См. api.get_active_subcards_by_card_id.
+    """
+    return await _db(tx).fetch_all(queries.GET_ACTIVE_SUBCARDS_BY_CARD_ID, params = {'card_id': card_id}, readonly = True, record = records.SubcardRecord)
+
+@try_return_bool
+async def transfer_money_between_subcards(*, tx = None, **kwargs):
+    """
+    Переводит деньги между субкартами в БД с занесением в логи. См. api.transfer_money_between_subcards.
+    """
+    _check_money_status(await _db(tx).fetch_one(prepared(queries.TRANSFER_MONEY_BETWEEN_SUBCARDS), params = kwargs), tx)
+    _invalidate(CARD_CACHE, [kwargs['card_id_from'], kwargs['card_id_to']], tx)
+    _invalidate(CATEGORY_CACHE, [kwargs['category_id_from'], kwargs['category_id_to']], tx)
+
+@try_return_none
+async def get_all_transactions_by_card_id(card_id, tx = None):
+    """
+    Получает все транзакции по карте из логов. См. api.get_all_transactions_by_card_id.
+    """
+    return await _db(tx).fetch_all(queries.GET_ALL_TRANSACTIONS_BY_CARD_ID, params = {'card_id': card_id}, readonly = True, record = records.TransactionRecord)
+
+@try_return_none
+async def get_time_bound_transactions_by_card_id(*, tx = None, **kwargs):
+    """
+    Получает транзакции в заданном временном промежутке по карте из логов. См. api.get_time_bound_transactions_by_card_id.
+    """
+    return await _db(tx).fetch_all(queries.GET_TIME_BOUND_TRANSACTIONS_BY_CARD_ID, params = kwargs, readonly = True, record = records.TransactionRecord)
+
+@try_return_none
+async def get_all_transactions_by_category_id(category_id, tx = None):
+    """
+    Получает все транзакции по категории из логов. См. api.get_all_transactions_by_category_id.
+    """
+    return await _db(tx).fetch_all(queries.GET_ALL_TRANSACTIONS_BY_CATEGORY_ID, params = {'category_id': category_id}, readonly = True, record = records.TransactionRecord)
+
+@try_return_none
+async def get_time_bound_transactions_by_category_id(*, tx = None, **kwargs):
+    """
+    Получает транзакции в заданном временном промежутке по категории из логов. См. api.get_time_bound_transactions_by_category_id.
+    """
+    return await _db(tx).fetch_all(queries.GET_TIME_BOUND_TRANSACTIONS_BY_CATEGORY_ID, params = kwargs, readonly = True, record = records.TransactionRecord)
+
+async def _get_transactions_page(column_from, column_to, entity_id, page_size, cursor, tx):
+    sql, params = _transactions_page_query(column_from, column_to, entity_id, page_size, cursor)
+    return _transactions_page_result(await _db(tx).fetch_all(sql, params = params, readonly = True, record = records.TransactionRecord), page_size)
+
+@try_return_none
+async def get_transactions_page_by_card_id(card_id, page_size = 50, cursor = None, tx = None):
+    """
+    Получает страницу транзакций по карте, от новых к старым. См. api.get_transactions_page_by_card_id.
+    """
+    return await _get_transactions_page("card_id_from", "card_id_to", card_id, page_size, cursor, tx)
+
+@try_return_none
+async def get_transactions_page_by_category_id(category_id, page_size = 50, cursor = None, tx = None):
+    """
+    Получает страницу транзакций по категории, от новых к старым. См. api.get_transactions_page_by_category_id.
+    """
+    return await _get_transactions_page("category_id_from", "category_id_to", category_id, page_size, cursor, tx)
+
+def _stream_transactions(column_from, column_to, entity_id, batch_size):
+    return ADB.stream(queries.STREAM_TRANSACTIONS.format(column_from = column_from, column_to = column_to), params = {'entity_id': entity_id}, batch_size = batch_size, readonly = True, record = records.TransactionRecord)
+
+def stream_transactions_by_card_id(card_id, batch_size = 1000):
+    """
+    Потоково отдаёт всю историю транзакций по карте, от старых к новым. См. api.stream_transactions_by_card_id.
+    Возвращает асинхронный генератор (async for), ошибки БД возникают при итерации.
+    """
+    return _stream_transactions("card_id_from", "card_id_to", card_id, batch_size)
+
+def stream_transactions_by_category_id(category_id, batch_size = 1000):
+    """
+    Потоково отдаёт всю историю транзакций по категории, от старых к новым. См. api.stream_transactions_by_category_id.
+    Возвращает асинхронный генератор (async for), ошибки БД возникают при итерации.
+    """
+    return _stream_transactions("category_id_from", "category_id_to", category_id, batch_size)
+
+@try_return_none
+async def collect_category_money_on_one_subcard(*, tx = None, **kwargs):
+    """
+    Собирает все деньги одной категории на одну карту одним запросом. См. api.collect_category_money_on_one_subcard.
+    """
+    params = _collect_params(kwargs)
+    return _collect_summary(params, await _db(tx).fetch_all(queries.COLLECT_CATEGORY_MONEY_ON_ONE_SUBCARD, params = params), tx)
+
+@try_return_none
+async def bulk_import_transactions(rows, tx = None):
+    """
+    Загружает транзакции через COPY и применяет их к балансам субкарт - всё или ничего. См. api.bulk_import_transactions.
+    """
+    if tx is None:
+        async with ADB.transaction() as tx:
+            return await _bulk_import_transactions(rows, tx)
+    return await _bulk_import_transactions(rows, tx)
+
+async def _bulk_import_transactions(rows, tx):
+    start = time.perf_counter()
+    await tx.execute(queries.CREATE_TRANSACTION_IMPORT)
+    count = await tx.copy_from(queries.COPY_TRANSACTION_IMPORT, rows)
+    await tx.execute(queries.ANALYZE_TRANSACTION_IMPORT)
+    _check_import_errors(await tx.fetch_all(queries.GET_INVALID_TRANSACTION_IMPORT_ROWS, params = {'limit': IMPORT_ERRORS_LIMIT}), tx)
+    await tx.execute(queries.INSERT_TRANSACTION_IMPORT)
+    touched = await tx.fetch_all(queries.APPLY_TRANSACTION_IMPORT_DELTAS)
+    await tx.execute(queries.DROP_TRANSACTION_IMPORT)
+    _invalidate(CARD_CACHE, {card_id for card_id, _ in touched}, tx)
+    _invalidate(CATEGORY_CACHE, {category_id for _, category_id in touched}, tx)
+    return _import_summary(count, start)
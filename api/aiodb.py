@@ -0,0 +1,364 @@
+import asyncio
+import functools
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+import psycopg
+from psycopg import AsyncClientCursor
+from psycopg.rows import tuple_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+from . import metrics
+from .config import load_database_config
+from .db import CONFIG_KEYS, PoolOverloadedError, _mark_write, _prepared, _prepared_names, _use_read_pool
+
+# Те же имена уровней изоляции, что и в db.py
+ISOLATION_MAP = {
+    "autocommit": None,
+    "read_committed": psycopg.IsolationLevel.READ_COMMITTED,
+    "repeatable_read": psycopg.IsolationLevel.REPEATABLE_READ,
+    "serializable": psycopg.IsolationLevel.SERIALIZABLE,
+}
+
+Params = Optional[Union[Dict[str, Any], Tuple[Any, ...]]]
+
+# как db.RETRYABLE_ERRORS: обрыв соединения, после которого чтение можно повторить
+RETRYABLE_ERRORS = (psycopg.OperationalError, psycopg.InterfaceError)
+
+async def _execute(cur, sql: str, params: Params, prepare: bool = True):
+    """Асинхронный db._execute(): запросы, помеченные db.prepared(), идут через PREPARE/EXECUTE."""
+    entry = _prepared.get(sql) if prepare else None
+    if entry is not None:
+        statements, sql = entry
+        done = _prepared_names(cur.connection)
+        for name, prepare_sql in statements:
+            if name not in done:
+                await cur.execute(prepare_sql)
+                done.add(name)
+    await cur.execute(sql, params)
+
+def _row_factory(record: Optional[type]):
+    """row_factory psycopg 3 для класса записи из records.py: строки собирает сам курсор, без промежуточных кортежей."""
+    if record is None:
+        return tuple_row
+    return lambda cur: record._make
+
+class AsyncTransaction:
+    """
+    Открытая транзакция, которую выдаёт AsyncDatabase.transaction() - асинхронный аналог db.Transaction.
+    Все команды идут через одно соединение, commit - один раз при выходе из блока async with.
+    Аргументы isolation и readonly в методах игнорируются - уровень изоляции задаётся при открытии транзакции,
+    а транзакция всегда идёт через основную БД.
+    """
+
+    def __init__(self, cur, prepare_statements: bool = True):
+        self._cur = cur
+        self._prepare_statements = prepare_statements
+        self.failed = False
+        self._callbacks = []
+
+    def add_callback(self, callback):
+        """Вызвать callback() после завершения транзакции (и при commit, и при откате) - например, для сброса кэша."""
+        self._callbacks.append(callback)
+
+    async def _run(self, sql: str, params: Params, record: Optional[type] = None):
+        try:
+            with metrics.observe_query("write", sql):
+                self._cur.row_factory = _row_factory(record)
+                await _execute(self._cur, sql, params, self._prepare_statements)
+        except Exception:
+            # транзакция в Postgres после ошибки всё равно неработоспособна, запоминаем, чтобы не сделать commit
+            self.failed = True
+            raise
+
+    async def execute(self, sql: str, isolation: str = None, params: Params = None, readonly: bool = False) -> int:
+        await self._run(sql, params)
+        return self._cur.rowcount
+
+    async def fetch_one(self, sql: str, isolation: str = None, params: Params = None, readonly: bool = False, record: Optional[type] = None):
+        await self._run(sql, params, record)
+        return await self._cur.fetchone()
+
+    async def fetch_all(self, sql: str, isolation: str = None, params: Params = None, readonly: bool = False, record: Optional[type] = None):
+        await self._run(sql, params, record)
+        return await self._cur.fetchall()
+
+    async def fetch_one_returning(self, sql: str, isolation: str = None, params: Params = None, readonly: bool = False,
+                                  record: Optional[type] = None):
+        return await self.fetch_one(sql, isolation, params, readonly, record)
+
+    async def copy_from(self, sql: str, rows: Iterable[Tuple[Any, ...]]) -> int:
+        """
+        COPY ... FROM STDIN строками rows, как db.Transaction.copy_from(). Возвращает число загруженных строк.
+        """
+        try:
+            with metrics.observe_query("write", sql):
+                async with self._cur.copy(sql) as copy:
+                    for row in rows:
+                        await copy.write_row(row)
+        except Exception:
+            self.failed = True
+            raise
+        return self._cur.rowcount
+
+
+class AsyncDatabase:
+    """
+    Асинхронный аналог db.Database на psycopg 3 и psycopg_pool.AsyncConnectionPool.
+    Курсоры клиентские (AsyncClientCursor): параметры подставляются на клиенте, как в psycopg2,
+    поэтому работают те же тексты запросов из queries.py - с %(name)s и несколькими командами через ";".
+    Пул открывается при первом запросе, внутри работающего event loop, и привязан к нему;
+    в процессе-потомке после fork() пул создаётся заново, как и в db.Database.
+    Как и в db.Database, с read_dsn запросы с readonly=True идут в отдельный пул чтения (с учётом read-your-writes).
+    Проверка соединений тоже как в db.Database: max_lifetime передаётся в psycopg_pool, а пролежавшее
+    дольше health_check_interval соединение перед выдачей проверяется SELECT 1 (колбэк check пула).
+    """
+    _instance = None
+    _configured = False
+
+    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 10,
+                 connect_timeout: Optional[int] = None, statement_timeout: Optional[int] = None,
+                 read_dsn: Optional[str] = None, checkout_timeout: float = 5.0,
+                 max_lifetime: Optional[float] = 1800.0, health_check_interval: Optional[float] = 30.0,
+                 read_retries: int = 2, retry_backoff: float = 0.1, prepare_statements: bool = True):
+        # не вызывать напрямую — пользуйся configure()/instance()
+        self._dsn = dsn
+        self._read_dsn = read_dsn
+        self._checkout_timeout = checkout_timeout
+        self._max_lifetime = max_lifetime
+        self._health_check_interval = health_check_interval
+        self._read_retries = read_retries
+        self._retry_backoff = retry_backoff
+        self._prepare_statements = prepare_statements
+        self._idle_since = {} # id(conn) -> time.monotonic() возврата в пул
+        self._minconn = minconn
+        self._maxconn = maxconn
+        self._connect_kwargs = {"cursor_factory": AsyncClientCursor}
+        if connect_timeout:
+            self._connect_kwargs["connect_timeout"] = connect_timeout
+        if statement_timeout:
+            self._connect_kwargs["options"] = f"-c statement_timeout={statement_timeout}"
+        self._inherited_pools = []
+        self._pools = {} # "write"/"read" -> AsyncConnectionPool
+        self._pool_pid = os.getpid()
+
+    def _pool_role(self, read: bool) -> str:
+        return "read" if read and self._read_dsn else "write"
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Занятые и свободные соединения каждого уже созданного пула ("write"/"read") - для метрик.
+        """
+        stats = {}
+        for role, pool in list(self._pools.items()):
+            pool_stats = pool.get_stats()
+            idle = pool_stats.get("pool_available", 0)
+            stats[role] = {"in_use": pool_stats.get("pool_size", 0) - idle, "idle": idle,
+                           "waiting": pool_stats.get("requests_waiting", 0), "maxconn": pool.max_size}
+        return stats
+
+    async def _check_connection(self, role: str, conn):
+        # колбэк check пула: исключение - пул закрывает соединение и выдаёт другое
+        idle_since = self._idle_since.pop(id(conn), None)
+        try:
+            if conn.closed:
+                raise psycopg.OperationalError("connection is closed")
+            if self._health_check_interval is not None \
+                    and (idle_since is None or time.monotonic() - idle_since > self._health_check_interval):
+                await AsyncConnectionPool.check_connection(conn)
+        except psycopg.Error:
+            metrics.POOL_EVICTED_TOTAL.inc(role, "failed_check")
+            raise
+
+    async def _reset_connection(self, conn):
+        # колбэк reset пула: соединение возвращено и будет лежать в пуле
+        self._idle_since[id(conn)] = time.monotonic()
+
+    def _get_pool(self, read: bool) -> AsyncConnectionPool:
+        if self._pool_pid != os.getpid():
+            # пулы родителя не закрываем (их соединения - сокеты родителя), только перестаём ими пользоваться
+            self._inherited_pools.extend(self._pools.values())
+            self._pools = {}
+            self._pool_pid = os.getpid()
+        role = self._pool_role(read)
+        pool = self._pools.get(role)
+        if pool is None:
+            pool = self._pools[role] = AsyncConnectionPool(
+                self._read_dsn if role == "read" else self._dsn,
+                min_size=self._minconn,
+                max_size=self._maxconn,
+                timeout=self._checkout_timeout, # очередь ожидающих в psycopg_pool и так FIFO
+                max_lifetime=self._max_lifetime or float("inf"),
+                check=functools.partial(self._check_connection, role),
+                reset=self._reset_connection,
+                kwargs=self._connect_kwargs,
+                open=False,
+            )
+        return pool
+
+    @classmethod
+    def configure(cls, dsn: str, minconn: int = 1, maxconn: int = 10, **options):
+        """
+        Явно задать настройки синглтона (до первого instance()). Без вызова берутся из config.load_database_config().
+        options - остальные именованные аргументы конструктора, как в db.Database.configure().
+        """
+        cls._settings = dict(options, dsn=dsn, minconn=minconn, maxconn=maxconn)
+        cls._configured = True
+
+    @classmethod
+    def instance(cls) -> "AsyncDatabase":
+        # создание пула не ждёт ввода-вывода, поэтому в одном event loop блокировка не нужна
+        if cls._instance is None:
+            if not cls._configured:
+                config = load_database_config()
+                config["maxconn"] = config["aio_maxconn"]
+                cls.configure(**{key: config[key] for key in CONFIG_KEYS})
+            cls._instance = AsyncDatabase(**cls._settings)
+        return cls._instance
+
+    async def close(self):
+        for pool in self._pools.values():
+            await pool.close()
+
+    # --- приватные утилиты ---
+    @staticmethod
+    async def _apply_isolation(conn, isolation: str):
+        # как и в db.py, меняем режим сессии только если запрошен другой; между вызовами не восстанавливаем
+        level = ISOLATION_MAP[isolation]
+        if level is None:
+            if not conn.autocommit:
+                await conn.set_autocommit(True)
+            return
+        if conn.autocommit:
+            await conn.set_autocommit(False)
+        if conn.isolation_level != level:
+            await conn.set_isolation_level(level)
+
+    @asynccontextmanager
+    async def _connection(self, isolation: str, read: bool = False):
+        """
+        Соединение из пула с нужным режимом. При выходе из блока пул сам делает commit,
+        а при исключении - rollback, после чего возвращает соединение в пул.
+        """
+        pool = self._get_pool(read)
+        role = self._pool_role(read)
+        if pool.closed:
+            await pool.open()
+        start = time.perf_counter()
+        try:
+            async with pool.connection() as conn:
+                metrics.POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start, role)
+                await self._apply_isolation(conn, isolation)
+                yield conn
+        except PoolTimeout as e:
+            metrics.POOL_CHECKOUT_TIMEOUTS_TOTAL.inc(role)
+            raise PoolOverloadedError(f"no free connection in pool '{role}' within {self._checkout_timeout} s") from e
+
+    async def _query(self, sql: str, isolation: str, params: Params, readonly: bool, result, record: Optional[type] = None):
+        """
+        Как db.Database._query(): один запрос, result(cur) - корутина, забирающая результат (строки - записи record);
+        readonly-запросы при обрыве соединения повторяются до read_retries раз с экспоненциальной паузой.
+        """
+        attempt = 0
+        while True:
+            read = _use_read_pool(readonly)
+            try:
+                async with self._connection(isolation, read) as conn:
+                    with metrics.observe_query(self._pool_role(read), sql):
+                        cur = conn.cursor(row_factory=_row_factory(record))
+                        await _execute(cur, sql, params, self._prepare_statements)
+                        value = await result(cur)
+                    return value
+            except RETRYABLE_ERRORS as e:
+                if not readonly or attempt >= self._read_retries or isinstance(e, psycopg.errors.QueryCanceled):
+                    raise
+            metrics.QUERY_RETRIES_TOTAL.inc(metrics.current_operation.get(), self._pool_role(read))
+            await asyncio.sleep(self._retry_backoff * 2 ** attempt)
+            attempt += 1
+
+    # --- публичные методы в стиле db.Database ---
+    async def execute(self, sql: str, isolation: str = "read_committed", params: Params = None, readonly: bool = False) -> int:
+        """
+        Выполнить команду (INSERT/UPDATE/DELETE/DDL). Возвращает rowcount.
+        """
+        async def rowcount(cur):
+            return cur.rowcount
+        return await self._query(sql, isolation, params, readonly, rowcount)
+
+    async def fetch_one(self, sql: str, isolation: str = "read_committed", params: Params = None, readonly: bool = False,
+                        record: Optional[type] = None):
+        """record - класс записи из records.py для строк результата (здесь и в fetch_all/stream), без него - кортежи."""
+        return await self._query(sql, isolation, params, readonly, lambda cur: cur.fetchone(), record)
+
+    async def fetch_all(self, sql: str, isolation: str = "read_committed", params: Params = None, readonly: bool = False,
+                        record: Optional[type] = None):
+        return await self._query(sql, isolation, params, readonly, lambda cur: cur.fetchall(), record)
+
+    async def fetch_one_returning(self, sql: str, isolation: str = "read_committed", params: Params = None, readonly: bool = False,
+                                  record: Optional[type] = None):
+        """Удобно для INSERT ... RETURNING id"""
+        return await self.fetch_one(sql, isolation, params, readonly, record)
+
+    async def fetch_many(self, statements: Iterable[Tuple[str, Params]], isolation: str = "read_committed", readonly: bool = False):
+        """
+        Выполнить несколько независимых запросов на одном соединении в pipeline-режиме:
+        все запросы отправляются серверу сразу, результаты читаются потом - один сетевой round trip вместо N.
+        Каждый запрос - одна команда (без ";" между командами), обычно SELECT.
+        Возвращает список результатов fetchall() в порядке запросов.
+        """
+        async with self._connection(isolation, _use_read_pool(readonly)) as conn:
+            async with conn.pipeline():
+                cursors = []
+                for sql, params in statements:
+                    cur = conn.cursor()
+                    await cur.execute(sql, params)
+                    cursors.append(cur)
+            return [await cur.fetchall() for cur in cursors]
+
+    async def stream(self, sql: str, params: Params = None, batch_size: int = 1000, isolation: str = "read_committed", readonly: bool = False,
+                     record: Optional[type] = None):
+        """
+        Асинхронный генератор строк результата через именованный (server-side) курсор, пачками по batch_size.
+        Соединение из пула занято, пока генератор не исчерпан или не закрыт (aclose()).
+        """
+        if isolation == "autocommit":
+            raise ValueError("server-side cursors require a transaction")
+        async with self._connection(isolation, _use_read_pool(readonly)) as conn:
+            async with conn.cursor(name=f"stream_{uuid.uuid4().hex}", row_factory=_row_factory(record)) as cur:
+                cur.itersize = batch_size
+                await cur.execute(sql, params)
+                async for row in cur:
+                    yield row
+
+    @asynccontextmanager
+    async def transaction(self, isolation: str = "read_committed"):
+        """
+        Unit of work: одно соединение из пула и один commit на весь блок async with.
+        Отдаёт AsyncTransaction, который передаётся в функции aio именованным аргументом tx.
+        При исключении внутри блока или ошибке любой команды транзакция откатывается;
+        если ошибку команды "проглотили" (декораторы aio), после отката бросается RuntimeError.
+        """
+        if isolation == "autocommit":
+            raise ValueError("transaction() requires a transactional isolation level")
+        _mark_write()
+        tx = None
+        try:
+            async with self._connection(isolation) as conn:
+                tx = AsyncTransaction(conn.cursor(), self._prepare_statements)
+                yield tx
+                if tx.failed:
+                    await conn.rollback()
+        finally:
+            if tx is not None:
+                for callback in tx._callbacks:
+                    callback()
+        if tx.failed:
+            raise RuntimeError("transaction rolled back: one of its statements failed")
+
+    # ping для healthcheck
+    async def ping(self):
+        await self.fetch_one("SELECT 1", "autocommit")
+
@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Потокобезопасный in-process кэш: запись живёт не дольше ttl секунд,
+    при переполнении вытесняется давно не использованная (LRU).
+    None не хранится - get() возвращает None при промахе.
+    Значения отдаются как есть, поэтому изменять их нельзя.
+
+    Read-through без гонки с invalidate(): номер generation(key) берётся до запроса к БД и передаётся в put(),
+    который не запишет строку, если за время запроса ключ сбросили - иначе старая строка вернулась бы в кэш на весь ttl.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generations: Dict[Hashable, int] = {} # ключ -> сколько раз сброшен
+        self._epoch = 0 # сколько раз вызван clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def generation(self, key: Hashable) -> tuple:
+        """Номер версии ключа: меняется при каждом invalidate(key) и clear()."""
+        with self._lock:
+            return self._epoch, self._generations.get(key, 0)
+
+    def put(self, key: Hashable, value: Any, generation: Optional[tuple] = None):
+        """Запомнить value; с generation - только если ключ не сбрасывали с момента generation(key)."""
+        if value is None:
+            return
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key, 0)):
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
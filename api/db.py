@@ -1,9 +1,20 @@
+import collections
+import contextvars
+import os
+import re
 import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
 from typing import Any, Dict, Iterable, Optional, Tuple, Union
 
 import psycopg2
-from psycopg2.pool import ThreadedConnectionPool
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN, QueryCanceledError
+
+from . import metrics
+from .config import load_database_config
 
 # Допустимые значения изоляции, можно расширить
 ISOLATION_MAP = {
@@ -15,21 +26,451 @@ ISOLATION_MAP = {
 
 Params = Optional[Union[Dict[str, Any], Tuple[Any, ...]]]
 
+# ключи config.load_database_config(), которые принимает конструктор Database
+CONFIG_KEYS = ("dsn", "minconn", "maxconn", "connect_timeout", "statement_timeout", "read_dsn", "checkout_timeout",
+               "max_lifetime", "health_check_interval", "read_retries", "retry_backoff", "prepare_statements")
+
+# ошибки уровня соединения (обрыв, рестарт БД), после которых чтение можно повторить на другом соединении
+RETRYABLE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+"""
+Read-your-writes: внутри области (обычно один HTTP запрос) после первой записи чтения с readonly=True
+тоже идут в основную БД, чтобы пользователь сразу видел своё изменение, даже если реплика отстаёт.
+Вне области чтения всегда идут в пул чтения.
+"""
+_primary_reads = contextvars.ContextVar("primary_reads", default=None)
+
+def begin_read_your_writes():
+    """Открыть область read-your-writes в текущем контексте. Возвращает токен для end_read_your_writes()."""
+    return _primary_reads.set([False])
+
+def end_read_your_writes(token):
+    _primary_reads.reset(token)
+
+def _mark_write():
+    state = _primary_reads.get()
+    if state is not None:
+        state[0] = True
+
+def _use_read_pool(readonly: bool) -> bool:
+    if not readonly:
+        _mark_write()
+        return False
+    state = _primary_reads.get()
+    return state is None or not state[0]
+
+"""
+Подготовленные запросы: текст, помеченный prepared(), на каждом соединении один раз отправляется
+командой PREPARE, а дальше выполняется как EXECUTE имя(параметры) - Postgres не разбирает и не планирует его заново.
+Запрос из нескольких команд через ";" готовится покомандно и выполняется одной строкой "EXECUTE a(...); EXECUTE b(...)".
+Параметры по-прежнему подставляет драйвер, поэтому вызывающий код передаёт те же params.
+Отключается настройкой prepare_statements (например, за pgbouncer в режиме pool_mode=transaction).
+"""
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+_prepared = {} # текст запроса -> (((имя, "PREPARE ..."), ...), "EXECUTE ...")
+_statement_names = {} # текст одной команды -> имя подготовленного запроса
+_prepared_on = weakref.WeakKeyDictionary() # соединение -> имена уже подготовленных на нём запросов
+_prepared_lock = threading.Lock()
+
+def prepared(sql: str) -> str:
+    """
+    Пометить запрос как горячий: Database будет выполнять его через PREPARE/EXECUTE. Возвращает sql без изменений,
+    так что вызов ставится прямо в месте запроса. Команды разделяются по ";", поэтому ";" в строковых литералах недопустима.
+    """
+    if sql not in _prepared:
+        with _prepared_lock:
+            if sql not in _prepared:
+                _prepared[sql] = _compile_prepared(sql)
+    return sql
+
+def _compile_prepared(sql: str):
+    statements, executes = [], []
+    for statement in sql.split(";"):
+        statement = statement.strip()
+        if not statement:
+            continue
+        args = [] # плейсхолдеры драйвера в порядке номеров $1, $2, ...
+
+        def to_positional(match):
+            placeholder = match.group(0)
+            if placeholder == "%%":
+                return "%" # PREPARE уходит без параметров, драйвер "%%" не раскрывает
+            if placeholder == "%s" or placeholder not in args:
+                args.append(placeholder)
+                return f"${len(args)}"
+            return f"${args.index(placeholder) + 1}"
+
+        body = _PLACEHOLDER.sub(to_positional, statement)
+        name = _statement_names.setdefault(body, f"smart_banking_{len(_statement_names) + 1}")
+        statements.append((name, f"PREPARE {name} AS {body}"))
+        executes.append(f"EXECUTE {name}({', '.join(args)})" if args else f"EXECUTE {name}")
+    return tuple(statements), "; ".join(executes) + ";"
+
+def _prepared_names(conn) -> set:
+    with _prepared_lock:
+        return _prepared_on.setdefault(conn, set())
+
+def _execute(cur, sql: str, params: Params, prepare: bool = True):
+    """
+    cur.execute(sql, params), но запрос, помеченный prepared(), идёт через EXECUTE (с PREPARE при первом вызове на соединении).
+    """
+    entry = _prepared.get(sql) if prepare else None
+    if entry is not None:
+        statements, sql = entry
+        done = _prepared_names(cur.connection)
+        for name, prepare_sql in statements:
+            if name not in done:
+                # PREPARE не транзакционный: подготовленный запрос переживает и откат транзакции
+                cur.execute(prepare_sql)
+                done.add(name)
+    cur.execute(sql, params)
+
+"""
+Записи: fetch_* и stream принимают record - класс записи из records.py; строки результата приходят экземплярами
+этого класса (record._make(row)) вместо кортежей. Без record - кортежи, как у курсора psycopg2.
+"""
+
+def _fetch_one(cur, record: Optional[type]):
+    row = cur.fetchone()
+    return row if record is None or row is None else record._make(row)
+
+def _fetch_all(cur, record: Optional[type]):
+    rows = cur.fetchall()
+    return rows if record is None else list(map(record._make, rows))
+
+class PoolOverloadedError(Exception):
+    """
+    Все соединения пула заняты, и ни одно не освободилось за время ожидания (checkout_timeout).
+    Это перегрузка, а не ошибка данных: декораторы API пробрасывают её, а не превращают в None/False.
+    """
+
+class _Waiter:
+    __slots__ = ("event", "conn", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.conn = None
+        self.error = None
+
+class BoundedConnectionPool(ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool, в котором getconn() при занятых maxconn соединениях не падает сразу с PoolError,
+    а ждёт освобождения соединения не дольше timeout секунд, после чего бросает PoolOverloadedError.
+    Ждущие обслуживаются строго по очереди (FIFO): освобождённое соединение передаётся первому в очереди,
+    а новый вызов getconn() не обгоняет тех, кто уже ждёт.
+
+    Перед выдачей соединение проверяется: разорванные (например, после рестарта Postgres) и прожившие дольше
+    max_lifetime секунд закрываются и заменяются новыми; пролежавшее в пуле дольше health_check_interval
+    секунд проверяется запросом SELECT 1. Так после рестарта БД пул очищается сам, без рестарта процесса.
+    """
+
+    def __init__(self, minconn, maxconn, *args, timeout: float = 5.0, name: str = "write",
+                 max_lifetime: Optional[float] = 1800.0, health_check_interval: Optional[float] = 30.0, **kwargs):
+        self._opened_at = {} # id(conn) -> time.monotonic() открытия
+        self._idle_since = {} # id(conn) -> time.monotonic() возврата в пул
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.timeout = timeout
+        self.name = name # метка пула в метриках
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self._waiters = collections.deque()
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        self._opened_at[id(conn)] = self._idle_since[id(conn)] = time.monotonic()
+        return conn
+
+    def _forget(self, conn):
+        self._opened_at.pop(id(conn), None)
+        self._idle_since.pop(id(conn), None)
+
+    def _expired(self, conn) -> bool:
+        return bool(self.max_lifetime) and time.monotonic() - self._opened_at.get(id(conn), time.monotonic()) > self.max_lifetime
+
+    def _check(self, conn) -> Optional[str]:
+        """
+        Причина, по которой соединение нельзя выдавать (для метрик), или None, если оно годное.
+        """
+        if conn.closed or conn.info.transaction_status == TRANSACTION_STATUS_UNKNOWN:
+            return "broken"
+        if self._expired(conn):
+            return "expired"
+        idle_since = self._idle_since.get(id(conn))
+        if idle_since is not None and self.health_check_interval is not None and time.monotonic() - idle_since > self.health_check_interval:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                if not conn.autocommit:
+                    conn.rollback()
+            except psycopg2.Error:
+                return "failed_check"
+        return None
+
+    def getconn(self, key=None):
+        # негодные соединения выбрасываем и берём следующее; новое соединение годно заведомо,
+        # так что цикл короткий, а если БД недоступна - _connect бросит OperationalError
+        for _ in range(self.maxconn + 1):
+            conn = self._checkout(key)
+            reason = self._check(conn)
+            if reason is None:
+                self._idle_since.pop(id(conn), None)
+                return conn
+            metrics.POOL_EVICTED_TOTAL.inc(self.name, reason)
+            self.putconn(conn, close=True)
+        raise PoolError("no usable connection in pool")
+
+    def _checkout(self, key=None):
+        with self._lock:
+            if not self._waiters:
+                try:
+                    return self._getconn(key)
+                except PoolError:
+                    if self.closed:
+                        raise
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+        metrics.POOL_EXHAUSTED_TOTAL.inc(self.name)
+        if not waiter.event.wait(self.timeout):
+            with self._lock:
+                if not waiter.event.is_set():
+                    self._waiters.remove(waiter)
+                    metrics.POOL_CHECKOUT_TIMEOUTS_TOTAL.inc(self.name)
+                    raise PoolOverloadedError(f"no free connection in pool '{self.name}' within {self.timeout} s")
+        if waiter.error is not None:
+            raise waiter.error
+        return waiter.conn
+
+    def putconn(self, conn=None, key=None, close=False):
+        if not close and self._expired(conn):
+            metrics.POOL_EVICTED_TOTAL.inc(self.name, "expired")
+            close = True
+        with self._lock:
+            if (self._waiters and not close and not self.closed and not conn.closed
+                    and conn.info.transaction_status == TRANSACTION_STATUS_IDLE):
+                # исправное соединение сразу отдаём первому ждущему, не закрывая и не открывая заново
+                if key is None:
+                    key = self._rused.get(id(conn))
+                    if key is None:
+                        raise PoolError("trying to put unkeyed connection")
+                del self._used[key]
+                new_key = self._getkey()
+                self._used[new_key] = conn
+                self._rused[id(conn)] = new_key
+                waiter = self._waiters.popleft()
+                waiter.conn = conn
+                waiter.event.set()
+                return
+            self._putconn(conn, key, close)
+            if conn.closed:
+                self._forget(conn)
+            else:
+                self._idle_since[id(conn)] = time.monotonic()
+            self._serve_waiters()
+
+    def closeall(self):
+        with self._lock:
+            self._closeall()
+            self._opened_at.clear()
+            self._idle_since.clear()
+            self._serve_waiters()
+
+    def _serve_waiters(self):
+        # вызывается под self._lock, когда в пуле могло появиться место
+        while self._waiters:
+            waiter = self._waiters[0]
+            try:
+                waiter.conn = self._getconn()
+            except PoolError as e:
+                if not self.closed:
+                    return # места так и нет - ждём следующего putconn
+                waiter.error = e
+            except Exception as e: # не удалось открыть новое соединение
+                waiter.error = e
+            self._waiters.popleft()
+            waiter.event.set()
+
+# сколько байт за раз psycopg2 читает из потока строк COPY
+COPY_BUFFER_SIZE = 1 << 16
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return value.translate(_COPY_ESCAPES)
+    return str(value)
+
+class _CopyStream:
+    """
+    Файлоподобный объект для cursor.copy_expert: строки rows в текстовом формате COPY (табы, \\N для NULL).
+    """
+
+    def __init__(self, rows: Iterable[Tuple[Any, ...]]):
+        self._rows = iter(rows)
+        self._buffer = b""
+
+    def read(self, size: int = -1) -> bytes:
+        chunks, length = [self._buffer], len(self._buffer)
+        for row in self._rows:
+            line = ("\t".join(map(_copy_value, row)) + "\n").encode()
+            chunks.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        data = b"".join(chunks)
+        if size < 0:
+            size = len(data)
+        self._buffer = data[size:]
+        return data[:size]
+
+
+class Transaction:
+    """
+    Открытая транзакция, которую выдаёт Database.transaction().
+    Повторяет execute/fetch_* класса Database, но все команды идут через одно соединение,
+    а фиксация (commit) происходит один раз при выходе из блока with.
+    Аргументы isolation и readonly в методах игнорируются - уровень изоляции задаётся при открытии транзакции,
+    а транзакция всегда идёт через основную БД.
+    """
+
+    def __init__(self, cur, prepare_statements: bool = True):
+        self._cur = cur
+        self._prepare_statements = prepare_statements
+        self.failed = False
+        self._callbacks = []
+
+    def add_callback(self, callback):
+        """Вызвать callback() после завершения транзакции (и при commit, и при откате) - например, для сброса кэша."""
+        self._callbacks.append(callback)
+
+    def _run(self, sql: str, params: Params):
+        try:
+            with metrics.observe_query("write", sql):
+                _execute(self._cur, sql, params, self._prepare_statements)
+        except Exception:
+            # транзакция в Postgres после ошибки всё равно неработоспособна, запоминаем, чтобы не сделать commit
+            self.failed = True
+            raise
+
+    def execute(self, sql: str, isolation: str = None, params: Params = None, readonly: bool = False) -> int:
+        self._run(sql, params)
+        return self._cur.rowcount
+
+    def fetch_one(self, sql: str, isolation: str = None, params: Params = None, readonly: bool = False, record: Optional[type] = None):
+        self._run(sql, params)
+        return _fetch_one(self._cur, record)
+
+    def fetch_all(self, sql: str, isolation: str = None, params: Params = None, readonly: bool = False, record: Optional[type] = None):
+        self._run(sql, params)
+        return _fetch_all(self._cur, record)
+
+    def fetch_one_returning(self, sql: str, isolation: str = None, params: Params = None, readonly: bool = False, record: Optional[type] = None):
+        return self.fetch_one(sql, isolation, params, readonly, record)
+
+    def copy_from(self, sql: str, rows: Iterable[Tuple[Any, ...]]) -> int:
+        """
+        COPY ... FROM STDIN: строки rows (кортежи в порядке колонок из sql) потоком, без накопления в памяти.
+        Есть только у транзакции: COPY обычно грузит во временную таблицу, которая живёт на одном соединении.
+        Возвращает число загруженных строк.
+        """
+        try:
+            with metrics.observe_query("write", sql):
+                self._cur.copy_expert(sql, _CopyStream(rows), size=COPY_BUFFER_SIZE)
+        except Exception:
+            self.failed = True
+            raise
+        return self._cur.rowcount
+
+
 class Database:
+    """
+    Пул соединений psycopg2 с JDBC-подобными методами.
+    Пул создаётся при первом запросе, а не в конструкторе, и пересоздаётся в процессе-потомке после fork():
+    соединения (сокеты) никогда не делятся между процессами, поэтому pre-fork серверы (gunicorn) можно
+    запускать с импортом api в мастере - каждый воркер откроет свои соединения сам.
+    Пулов два: для записи (dsn) и для чтения (read_dsn - реплика или read-only роль); запросы с readonly=True
+    идут в пул чтения (с учётом read-your-writes, см. begin_read_your_writes). Без read_dsn пул один.
+    """
     _instance = None
     _lock = threading.RLock()
     _configured = False
 
-    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 10):
+    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 10,
+                 connect_timeout: Optional[int] = None, statement_timeout: Optional[int] = None,
+                 read_dsn: Optional[str] = None, checkout_timeout: float = 5.0,
+                 max_lifetime: Optional[float] = 1800.0, health_check_interval: Optional[float] = 30.0,
+                 read_retries: int = 2, retry_backoff: float = 0.1, prepare_statements: bool = True):
         # не вызывать напрямую — пользуйся configure()/instance()
-        self._pool = ThreadedConnectionPool(minconn, maxconn, dsn=dsn)
+        self._dsn = dsn
+        self._read_dsn = read_dsn
+        self._checkout_timeout = checkout_timeout
+        self._max_lifetime = max_lifetime
+        self._health_check_interval = health_check_interval
+        self._read_retries = read_retries
+        self._retry_backoff = retry_backoff
+        self._prepare_statements = prepare_statements
+        self._minconn = minconn
+        self._maxconn = maxconn
+        self._connect_kwargs = {}
+        if connect_timeout:
+            self._connect_kwargs["connect_timeout"] = connect_timeout
+        if statement_timeout:
+            self._connect_kwargs["options"] = f"-c statement_timeout={statement_timeout}"
+        self._pool_lock = threading.Lock()
+        self._pools = {} # "write"/"read" -> ThreadedConnectionPool
+        self._pool_pid = os.getpid()
+        self._inherited_pools = []
+        _databases.add(self)
+
+    @property
+    def _pool(self) -> BoundedConnectionPool:
+        return self._get_pool(False)
+
+    def _pool_role(self, read: bool) -> str:
+        return "read" if read and self._read_dsn else "write"
+
+    def _get_pool(self, read: bool) -> BoundedConnectionPool:
+        role = self._pool_role(read)
+        pool = self._pools.get(role)
+        if pool is None or self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool_pid != os.getpid():
+                    # пулы родителя не закрываем: закрытие отправит серверу Terminate по общему с родителем сокету;
+                    # держим ссылку, чтобы соединения не закрыл и сборщик мусора
+                    self._inherited_pools.extend(self._pools.values())
+                    self._pools = {}
+                    self._pool_pid = os.getpid()
+                pool = self._pools.get(role)
+                if pool is None:
+                    dsn = self._read_dsn if role == "read" else self._dsn
+                    pool = self._pools[role] = BoundedConnectionPool(
+                        self._minconn, self._maxconn, dsn=dsn, timeout=self._checkout_timeout, name=role,
+                        max_lifetime=self._max_lifetime, health_check_interval=self._health_check_interval, **self._connect_kwargs)
+        return pool
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Занятые и свободные соединения каждого уже созданного пула ("write"/"read") - для метрик.
+        """
+        stats = {}
+        for role, pool in list(self._pools.items()):
+            # у ThreadedConnectionPool нет публичных счётчиков: _used - выданные соединения, _pool - свободные
+            stats[role] = {"in_use": len(pool._used), "idle": len(pool._pool), "waiting": len(pool._waiters), "maxconn": pool.maxconn}
+        return stats
+
+    def _after_fork_in_child(self):
+        # замок мог быть захвачен другим потоком родителя в момент fork() - в потомке его никто не отпустит
+        self._pool_lock = threading.Lock()
 
     @classmethod
-    def configure(cls, dsn: str, minconn: int = 1, maxconn: int = 10):
+    def configure(cls, dsn: str, minconn: int = 1, maxconn: int = 10, **options):
+        """
+        Явно задать настройки синглтона (до первого instance()). Без вызова берутся из config.load_database_config().
+        options - остальные именованные аргументы конструктора (read_dsn, таймауты, max_lifetime, read_retries, ...).
+        """
         with cls._lock:
-            cls._dsn = dsn
-            cls._minconn = minconn
-            cls._maxconn = maxconn
+            cls._settings = dict(options, dsn=dsn, minconn=minconn, maxconn=maxconn)
             cls._configured = True
 
     @classmethod
@@ -38,77 +479,178 @@ class Database:
             with cls._lock:
                 if cls._instance is None:
                     if not cls._configured:
-                        raise RuntimeError("Database is not configured")
-                    cls._instance = Database(cls._dsn, cls._minconn, cls._maxconn)
+                        config = load_database_config()
+                        cls.configure(**{key: config[key] for key in CONFIG_KEYS})
+                    cls._instance = Database(**cls._settings)
         return cls._instance
 
     # --- приватные утилиты ---
-    def _get_conn_cursor(self, isolation: str):
-        conn = self._pool.getconn()
-        prev_iso = conn.isolation_level
-        conn.set_session(isolation_level=ISOLATION_MAP[isolation])
-        return conn, conn.cursor(), prev_iso
+    @staticmethod
+    def _apply_isolation(conn, isolation: str):
+        # состояние сессии соединения psycopg2 хранит на клиенте (autocommit/isolation_level),
+        # поэтому меняем его только если запрошен другой режим; между вызовами не восстанавливаем
+        level = ISOLATION_MAP[isolation]
+        if level == ISOLATION_LEVEL_AUTOCOMMIT:
+            if not conn.autocommit:
+                conn.autocommit = True
+        elif conn.autocommit or conn.isolation_level != level:
+            conn.set_session(isolation_level=level, autocommit=False)
+
+    def _get_conn_cursor(self, isolation: str, cursor_name: Optional[str] = None, read: bool = False):
+        pool = self._get_pool(read)
+        role = self._pool_role(read)
+        start = time.perf_counter()
+        conn = pool.getconn() # при перегрузке ждёт до checkout_timeout, затем PoolOverloadedError
+        metrics.POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start, role)
+        try:
+            self._apply_isolation(conn, isolation)
+        except Exception:
+            pool.putconn(conn)
+            raise
+        return conn, conn.cursor(name=cursor_name)
 
-    def _cleanup(self, conn, cur, prev_iso, success: bool):
+    def _cleanup(self, conn, cur, success: bool, read: bool = False):
         try:
-            if success:
-                if conn.isolation_level != ISOLATION_LEVEL_AUTOCOMMIT:
+            # курсор закрываем до commit: именованный (server-side) курсор живёт только внутри транзакции
+            try:
+                cur.close()
+            except Exception:
+                if success:
+                    raise
+            if not conn.autocommit and not conn.closed:
+                if success:
                     conn.commit()
-            else:
-                conn.rollback()
+                else:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        pass # соединение потеряно - пул его выбросит, а наружу уйдёт исходная ошибка
         finally:
+            self._get_pool(read).putconn(conn)
+
+    def _query(self, sql: str, isolation: str, params: Params, readonly: bool, result):
+        """
+        Один запрос на соединении из пула; result(cur) забирает результат.
+        Запросы с readonly=True (идемпотентные чтения) при обрыве соединения повторяются до read_retries раз
+        с экспоненциальной паузой: пул к этому моменту уже выбросил битое соединение и выдаст живое или новое.
+        """
+        attempt = 0
+        while True:
+            read = _use_read_pool(readonly)
             try:
-                conn.set_session(isolation_level=prev_iso)
-            except Exception:
-                pass
-            cur.close()
-            self._pool.putconn(conn)
+                conn, cur = self._get_conn_cursor(isolation, read=read)
+                ok = False
+                try:
+                    with metrics.observe_query(self._pool_role(read), sql):
+                        _execute(cur, sql, params, self._prepare_statements)
+                        value = result(cur)
+                    ok = True
+                    return value
+                finally:
+                    self._cleanup(conn, cur, ok, read)
+            except RETRYABLE_ERRORS as e:
+                if not readonly or attempt >= self._read_retries or isinstance(e, QueryCanceledError):
+                    raise
+            metrics.QUERY_RETRIES_TOTAL.inc(metrics.current_operation.get(), self._pool_role(read))
+            time.sleep(self._retry_backoff * 2 ** attempt)
+            attempt += 1
 
     # --- публичные методы JDBC-подобного стиля ---
-    def execute(self, sql: str, isolation: str = "read_committed", params: Params = None) -> int:
+    def execute(self, sql: str, isolation: str = "read_committed", params: Params = None, readonly: bool = False) -> int:
         """
         Выполнить команду (INSERT/UPDATE/DELETE/DDL). Возвращает rowcount.
+        readonly=True (здесь и в fetch_*) - запрос только читает: может идти в пул чтения и повторяется при обрыве соединения.
         """
-        conn, cur, prev_iso = self._get_conn_cursor(isolation)
-        ok = False
-        try:
-            cur.execute(sql, params)
-            ok = True
-            return cur.rowcount
-        finally:
-            self._cleanup(conn, cur, prev_iso, ok)
+        return self._query(sql, isolation, params, readonly, lambda cur: cur.rowcount)
 
-    def fetch_one(self, sql: str, isolation: str = "read_committed", params: Params = None):
-        conn, cur, prev_iso = self._get_conn_cursor(isolation)
+    def fetch_one(self, sql: str, isolation: str = "read_committed", params: Params = None, readonly: bool = False, record: Optional[type] = None):
+        return self._query(sql, isolation, params, readonly, lambda cur: _fetch_one(cur, record))
+
+    def fetch_all(self, sql: str, isolation: str = "read_committed", params: Params = None, readonly: bool = False, record: Optional[type] = None):
+        return self._query(sql, isolation, params, readonly, lambda cur: _fetch_all(cur, record))
+
+    def stream(self, sql: str, params: Params = None, batch_size: int = 1000, isolation: str = "read_committed", readonly: bool = False,
+               record: Optional[type] = None):
+        """
+        Генератор строк результата через именованный (server-side) курсор:
+        строки приходят пачками по batch_size (itersize), в памяти Python не копится весь результат.
+        Соединение из пула занято, пока генератор не исчерпан или не закрыт (close() / выход из цикла и сборка мусора).
+        """
+        if isolation == "autocommit":
+            raise ValueError("server-side cursors require a transaction")
+        read = _use_read_pool(readonly)
+        conn, cur = self._get_conn_cursor(isolation, cursor_name=f"stream_{uuid.uuid4().hex}", read=read)
+        cur.itersize = batch_size
         ok = False
         try:
-            cur.execute(sql, params)
+            with metrics.observe_query(self._pool_role(read), sql):
+                cur.execute(sql, params)
+            yield from (cur if record is None else map(record._make, cur))
             ok = True
-            return cur.fetchone()
         finally:
-            self._cleanup(conn, cur, prev_iso, ok)
+            self._cleanup(conn, cur, ok, read)
+
+    def fetch_one_returning(self, sql: str, isolation: str = "read_committed", params: Params = None, readonly: bool = False,
+                            record: Optional[type] = None):
+        """Удобно для INSERT ... RETURNING id"""
+        return self.fetch_one(sql, isolation, params, readonly, record)
 
-    def fetch_all(self, sql: str, isolation: str = "read_committed", params: Params = None):
-        conn, cur, prev_iso = self._get_conn_cursor(isolation)
+    @contextmanager
+    def transaction(self, isolation: str = "read_committed"):
+        """
+        Unit of work: одно соединение из пула и один commit на весь блок with.
+        Отдаёт Transaction, который передаётся в функции API именованным аргументом tx.
+        При исключении внутри блока или ошибке любой команды транзакция откатывается;
+        если ошибку команды "проглотили" (декораторы API), после отката бросается RuntimeError.
+        """
+        if isolation == "autocommit":
+            raise ValueError("transaction() requires a transactional isolation level")
+        _mark_write()
+        conn, cur = self._get_conn_cursor(isolation)
+        tx = Transaction(cur, self._prepare_statements)
         ok = False
         try:
-            cur.execute(sql, params)
-            ok = True
-            return cur.fetchall()
+            yield tx
+            ok = not tx.failed
         finally:
-            self._cleanup(conn, cur, prev_iso, ok)
-
-    def fetch_one_returning(self, sql: str, isolation: str = "read_committed", params: Params = None):
-        """Удобно для INSERT ... RETURNING id"""
-        return self.fetch_one(sql, isolation, params)
+            self._cleanup(conn, cur, ok)
+            for callback in tx._callbacks:
+                callback()
+        if tx.failed:
+            raise RuntimeError("transaction rolled back: one of its statements failed")
 
     # ping для healthcheck
     def ping(self):
-        conn, cur, prev_iso = self._get_conn_cursor("autocommit")
+        conn, cur = self._get_conn_cursor("autocommit")
         ok = False
         try:
             cur.execute("SELECT 1")
             cur.fetchone()
             ok = True
         finally:
-            self._cleanup(conn, cur, prev_iso, ok)
+            self._cleanup(conn, cur, ok)
+
+
+# все созданные Database - чтобы сбросить их замки в потомке после fork()
+_databases = weakref.WeakSet()
+
+def _after_fork_in_child():
+    Database._lock = threading.RLock()
+    for db in list(_databases):
+        db._after_fork_in_child()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+class LazyInstance:
+    """
+    Ссылка на синглтон cls.instance(), которая разрешается при каждом обращении к атрибуту.
+    Позволяет объявить модульную переменную (DB = LazyInstance(Database)) при импорте,
+    не читая настройки и не создавая пул до первого запроса.
+    """
+
+    def __init__(self, cls):
+        self._cls = cls
+
+    def __getattr__(self, name):
+        return getattr(self._cls.instance(), name)
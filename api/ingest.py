@@ -0,0 +1,131 @@
+"""
+Приём зачислений с отложенной записью (write-behind) для всплесков нагрузки - зарплатная ведомость, импорт от партнёра.
+
+api.inc_money_to_subcard - отдельная SQL транзакция и отдельный commit (ожидание fsync на сервере) на каждое зачисление,
+поэтому поток зачислений упирается в задержку commit. DepositQueue складывает зачисления в очередь процесса, а фоновый
+поток забирает их пачками и проводит пачку одним вызовом api.inc_money_to_subcards: одна транзакция и один commit
+на сотни зачислений, зачисления на одну субкарту складываются в одно изменение баланса.
+
+    with DepositQueue() as deposits:
+        futures = [deposits.submit(card_id, category_id, amount, "зарплата") for card_id, category_id, amount in payroll]
+        results = [future.result() for future in futures]
+
+submit() сразу возвращает concurrent.futures.Future; его результат - True/False, как у inc_money_to_subcard,
+после commit пачки. Из asyncio его можно ждать через asyncio.wrap_future(). Очередь ограничена (maxsize):
+если воркер не успевает, submit() ждёт свободное место не дольше put_timeout и бросает DepositQueueFullError.
+Зачисление, принятое в очередь, но не проведённое до остановки процесса, теряется - режим не для единичных
+платежей, где клиенту нужен ответ "зачислено" только после записи в БД: там остаётся inc_money_to_subcard.
+"""
+import concurrent.futures
+import queue
+import threading
+from typing import Any, Optional
+
+from . import api
+
+_STOP = object()
+
+
+class DepositQueueFullError(Exception):
+    """
+    Очередь зачислений заполнена, и место не освободилось за put_timeout: воркер не успевает за входящим потоком.
+    """
+
+
+class DepositQueue:
+    """
+    Очередь зачислений с фоновым воркером, который проводит их пачками до batch_size штук.
+    Воркер не ждёт, пока пачка наберётся: он забирает всё, что накопилось в очереди, пока шёл предыдущий commit
+    (а с max_delay > 0 ещё ждёт каждое следующее до max_delay секунд), поэтому при редких зачислениях задержка не растёт.
+    """
+
+    def __init__(self, maxsize: int = 10000, batch_size: int = 500, max_delay: float = 0.0, put_timeout: Optional[float] = 1.0):
+        self._queue = queue.Queue(maxsize)
+        self._batch_size = batch_size
+        self._max_delay = max_delay
+        self._put_timeout = put_timeout # None - ждать места сколько угодно, 0 - не ждать
+        self._closed = False
+        self.batches = 0 # сколько пачек провёл воркер
+        self.deposits = 0 # сколько зачислений было в этих пачках
+        self._worker = threading.Thread(target=self._run, name="deposit-queue", daemon=True)
+        self._worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def pending(self) -> int:
+        """Зачислений в очереди (приблизительно)."""
+        return self._queue.qsize()
+
+    def submit(self, card_id: int, category_id: int, inc_amount: Any, description: str = "") -> concurrent.futures.Future:
+        """
+        Поставить зачисление в очередь. Future получит True (зачислено) или False (неверные id или сумма,
+        нет субкарты, ошибка БД); неверное зачисление не мешает остальным в пачке.
+        PoolOverloadedError пачки передаётся в Future исключением.
+        Отменённый до начала проведения Future (cancel()) не зачисляется.
+        """
+        if self._closed:
+            raise RuntimeError("deposit queue is closed")
+        future = concurrent.futures.Future()
+        try:
+            self._queue.put(((card_id, category_id, inc_amount, description), future),
+                            block=self._put_timeout != 0, timeout=self._put_timeout or None)
+        except queue.Full:
+            raise DepositQueueFullError(f"deposit queue is full ({self._queue.maxsize} deposits)") from None
+        return future
+
+    def close(self, timeout: Optional[float] = None):
+        """Перестать принимать зачисления, провести уже принятые и остановить воркер."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+        self._worker.join(timeout)
+        if self._worker.is_alive():
+            return
+        # submit(), успевший проверить _closed до close(), мог положить зачисление уже после _STOP
+        while True:
+            try:
+                _, future = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("deposit queue is closed"))
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            while len(batch) < self._batch_size:
+                try:
+                    item = self._queue.get(timeout=self._max_delay) if self._max_delay else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._apply(batch)
+
+    def _apply(self, batch):
+        batch = [(deposit, future) for deposit, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = api.inc_money_to_subcards([deposit for deposit, _ in batch])
+        except Exception as e: # PoolOverloadedError - декоратор api её пробрасывает
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        if results is None: # ошибка БД: пачка откатилась целиком
+            results = [False] * len(batch)
+        self.batches += 1
+        self.deposits += len(batch)
+        for (_, future), ok in zip(batch, results):
+            future.set_result(ok)
@@ -0,0 +1,83 @@
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+from . import api
+
+
+class BatchLoader:
+    """
+    Загрузчик строк по id в пределах одного запроса (DataLoader): вместо SELECT ... WHERE id = %(id)s на каждый id
+    собирает запрошенные id и получает их одним запросом batch_fn(ids) (WHERE id = ANY(...)), результат запоминает.
+    Код синхронный, поэтому id, которые понадобятся позже (например, категории из процентов шаблонов перед
+    рендерингом страницы), заранее ставятся в очередь want(): первый же промах load() загрузит их все сразу.
+    Не потокобезопасен и не сбрасывается сам - создаётся на один HTTP запрос.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], Optional[Iterable[tuple]]],
+                 key: Callable[[tuple], Hashable] = lambda row: row[0], id_type: Callable[[Any], Hashable] = int):
+        self._batch_fn = batch_fn # ids -> строки или None при ошибке (функции api.get_*_by_ids)
+        self._key = key # id строки
+        self._id_type = id_type # id из json шаблонов и url - строки, в строках БД - int
+        self._rows: Dict[Hashable, Optional[tuple]] = {} # id -> строка, None - такого id нет
+        self._pending = set()
+        self.batches = 0 # сколько запросов к БД сделал загрузчик
+
+    def want(self, ids: Iterable[Any]):
+        """Поставить id в очередь, не загружая: они придут в БД вместе со следующим промахом."""
+        for entity_id in ids:
+            entity_id = self._id_type(entity_id)
+            if entity_id not in self._rows:
+                self._pending.add(entity_id)
+
+    def load(self, entity_id: Any) -> Optional[tuple]:
+        """Строка по id или None, если её нет (или БД вернула ошибку)."""
+        entity_id = self._id_type(entity_id)
+        if entity_id not in self._rows:
+            self._pending.add(entity_id)
+            self._dispatch()
+        return self._rows.get(entity_id)
+
+    def load_many(self, ids: Iterable[Any]) -> List[Optional[tuple]]:
+        ids = [self._id_type(entity_id) for entity_id in ids]
+        self.want(ids)
+        if self._pending:
+            self._dispatch()
+        return [self._rows.get(entity_id) for entity_id in ids]
+
+    def prime(self, rows: Iterable[tuple]):
+        """Запомнить уже полученные строки (например, из списка по owner_id), чтобы load() не ходил за ними в БД."""
+        for row in rows:
+            entity_id = self._key(row)
+            self._rows[entity_id] = row
+            self._pending.discard(entity_id)
+
+    def clear(self, entity_id: Any = None):
+        """Забыть строку (после её изменения в этом же запросе) или, без аргумента, все строки."""
+        if entity_id is None:
+            self._rows.clear()
+        else:
+            self._rows.pop(self._id_type(entity_id), None)
+
+    def _dispatch(self):
+        ids, self._pending = sorted(self._pending), set()
+        self.batches += 1
+        rows = self._batch_fn(ids)
+        if rows is None: # ошибка БД - не запоминаем "не найдено", следующий load() попробует снова
+            return
+        for entity_id in ids:
+            self._rows[entity_id] = None
+        self.prime(rows)
+
+
+class RequestLoaders:
+    """
+    Загрузчики основных сущностей для одного HTTP запроса; фронтенд держит экземпляр во flask.g.
+    """
+
+    def __init__(self):
+        self.cards = BatchLoader(api.get_cards_by_ids)
+        self.categories = BatchLoader(api.get_categories_by_ids)
+        self.templates = BatchLoader(api.get_templates_by_ids)
+
+    def clear(self):
+        for loader in (self.cards, self.categories, self.templates):
+            loader.clear()
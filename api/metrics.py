@@ -0,0 +1,176 @@
+"""
+Метрики слоя БД в формате Prometheus (text exposition format 0.0.4), без внешних зависимостей.
+Счётчики и гистограммы копятся в памяти процесса; при нескольких воркерах каждый отдаёт свои.
+
+Имя функции API, от имени которой выполняется запрос, хранится в contextvar current_operation:
+его выставляют декораторы api.py/aio.py, а Database подписывает им гистограмму времени запросов.
+Трасса запросов одного HTTP запроса (QueryTrace) - в contextvar current_trace: её открывает фронтенд (begin_trace),
+а каждый запрос к БД, прошедший через observe_query, добавляет в неё свой текст и время.
+"""
+import bisect
+import collections
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+current_operation = contextvars.ContextVar("current_operation", default="unknown")
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+# границы корзин гистограмм, секунды: от долей миллисекунды (выдача свободного соединения) до секунд (ожидание пула)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _labels_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labelnames, labelvalues)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labelvalues -> [счётчики по корзинам (не накопительные) + корзина +Inf, сумма]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            item = self._values.get(labelvalues)
+            if item is None:
+                item = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            item[0][index] += 1
+            item[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labelvalues, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                    lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, labelvalues, le)} {cumulative}")
+                labels = _labels_text(self.labelnames, labelvalues)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+def collected(name: str, documentation: str, samples: Iterable[Tuple[Dict[str, str], float]], kind: str = "gauge") -> List[str]:
+    """
+    Отрисовать метрику, значение которой снимается в момент запроса метрик (например, занятые соединения пула).
+    samples - пары (словарь меток, значение); kind - gauge или counter (если источник сам копит счётчик).
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels_text(tuple(labels), tuple(labels.values()))} {value}")
+    return lines
+
+POOL_CHECKOUT_SECONDS = Histogram(
+    "smart_banking_db_pool_checkout_seconds", "Time spent waiting for a pooled connection.", ["pool"])
+POOL_EXHAUSTED_TOTAL = Counter(
+    "smart_banking_db_pool_exhausted_total", "Checkouts that found every connection of the pool in use and had to queue.", ["pool"])
+POOL_CHECKOUT_TIMEOUTS_TOTAL = Counter(
+    "smart_banking_db_pool_checkout_timeouts_total", "Checkouts that gave up after checkout_timeout (overload errors).", ["pool"])
+POOL_EVICTED_TOTAL = Counter(
+    "smart_banking_db_pool_evicted_total", "Connections closed by the pool: broken, expired (max_lifetime) or failed_check.", ["pool", "reason"])
+QUERY_RETRIES_TOTAL = Counter(
+    "smart_banking_db_query_retries_total", "Read-only statements retried after a connection error.", ["operation", "pool"])
+QUERY_SECONDS = Histogram(
+    "smart_banking_db_query_seconds", "Statement latency (execute and fetch) by api function.", ["operation", "pool"])
+QUERY_ERRORS_TOTAL = Counter(
+    "smart_banking_db_query_errors_total", "Statements that raised, by api function.", ["operation", "pool"])
+
+class QueryTrace:
+    """
+    Запросы к БД в пределах одного HTTP запроса: сколько их было, сколько времени заняли и какие повторялись.
+    Одинаковый текст запроса (с точностью до пробелов, параметры не учитываются), выполненный много раз за
+    один HTTP запрос, - признак N+1: строки по одной вместо одного запроса по списку id.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = collections.Counter() # текст запроса -> сколько раз выполнен
+
+    def record(self, sql: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[" ".join(sql.split())] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Запросы, выполненные больше threshold раз, от самых частых."""
+        return [(sql, count) for sql, count in self.statements.most_common() if count > threshold]
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing: суммарное время БД в миллисекундах и число запросов."""
+        return f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries"'
+
+def begin_trace() -> contextvars.Token:
+    """Начать трассу запросов к БД для текущего контекста; токен передаётся в end_trace()."""
+    return current_trace.set(QueryTrace())
+
+def end_trace(token: contextvars.Token) -> Optional[QueryTrace]:
+    trace = current_trace.get()
+    current_trace.reset(token)
+    return trace
+
+@contextlib.contextmanager
+def observe_query(pool: str, sql: Optional[str] = None):
+    """
+    Замерить один запрос к БД: время в QUERY_SECONDS, исключение - в QUERY_ERRORS_TOTAL, с меткой текущей функции API.
+    Если открыта трасса (current_trace), запрос sql с его временем записывается и в неё.
+    """
+    operation = current_operation.get()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        QUERY_ERRORS_TOTAL.inc(operation, pool)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        QUERY_SECONDS.observe(elapsed, operation, pool)
+        trace = current_trace.get()
+        if trace is not None and sql is not None:
+            trace.record(sql, elapsed)
+
+REGISTRY = [POOL_CHECKOUT_SECONDS, POOL_EXHAUSTED_TOTAL, POOL_CHECKOUT_TIMEOUTS_TOTAL, POOL_EVICTED_TOTAL,
+            QUERY_SECONDS, QUERY_ERRORS_TOTAL, QUERY_RETRIES_TOTAL]
+
+def render(extra: Optional[List[str]] = None) -> str:
+    """
+    Текст всех метрик для эндпоинта /metrics; extra - строки collected(), снятые вызывающим кодом.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    if extra:
+        lines.extend(extra)
+    return "\n".join(lines) + "\n"
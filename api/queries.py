@@ -0,0 +1,442 @@
+"""
+SQL-запросы API. Общие для синхронного (api.py) и асинхронного (aio.py) слоёв, чтобы тексты запросов не расходились.
+Имя константы совпадает с именем функции API; шаблоны с {...} дополняются через str.format в месте вызова.
+"""
+
+ADD_USER = """
+    INSERT INTO "user" (login, password_hash, password_salt, name)
+    VALUES (%(login)s, %(password_hash)s, %(password_salt)s, %(name)s)
+    RETURNING id;
+"""
+
+GET_USER_BY_ID = """
+    SELECT id, login, password_hash, password_salt, name
+    FROM "user"
+    WHERE id = %(id)s;
+"""
+
+GET_USER_IDENTITY_BY_ID = """
+    SELECT id, login, name
+    FROM "user"
+    WHERE id = %(id)s;
+"""
+
+GET_USER_BY_LOGIN = """
+    SELECT id, login, password_hash, password_salt, name
+    FROM "user"
+    WHERE login = %(login)s;
+"""
+
+ADD_CARD = """
+    INSERT INTO card (owner_id, name, amount, is_active, description)
+    VALUES (%(owner_id)s, %(name)s, 0, true, %(description)s)
+    RETURNING id;
+"""
+
+DELETE_CARD_BY_ID = """
+    UPDATE card
+    SET is_active = false
+    WHERE id = %(id)s;
+"""
+
+GET_ACTIVE_CARDS_BY_OWNER_ID = """
+    SELECT id, owner_id, name, {card_amount}, is_active, description
+    FROM card
+    WHERE owner_id = %(owner_id)s AND is_active IS true
+    ORDER BY id;
+"""
+
+GET_ACTIVE_CARDS_OVERVIEW_BY_OWNER_ID = """
+    SELECT c.id, c.owner_id, c.name, {card_amount}, c.is_active, c.description,
+           s.id, s.category_id, s.amount, s.description, cat.name
+    FROM card c
+    LEFT JOIN subcard s ON s.card_id = c.id AND s.is_active IS true
+    LEFT JOIN category cat ON cat.id = s.category_id
+    WHERE c.owner_id = %(owner_id)s AND c.is_active IS true
+    ORDER BY c.id, s.id;
+"""
+
+ADD_CATEGORY = """
+    INSERT INTO category (owner_id, name, amount, is_active, description)
+    VALUES (%(owner_id)s, %(name)s, 0, true, %(description)s)
+    RETURNING id;
+"""
+
+GET_CATEGORY_BY_ID = """
+    SELECT id, owner_id, name, {category_amount}, is_active, description
+    FROM category
+    WHERE id = %(id)s;
+"""
+
+GET_CATEGORIES_BY_IDS = """
+    SELECT id, owner_id, name, {category_amount}, is_active, description
+    FROM category
+    WHERE id = ANY(%(ids)s::int8[])
+    ORDER BY id;
+"""
+
+GET_CARD_BY_ID = """
+    SELECT id, owner_id, name, {card_amount}, is_active, description
+    FROM card
+    WHERE id = %(id)s;
+"""
+
+GET_CARDS_BY_IDS = """
+    SELECT id, owner_id, name, {card_amount}, is_active, description
+    FROM card
+    WHERE id = ANY(%(ids)s::int8[])
+    ORDER BY id;
+"""
+
+GET_ACTIVE_CATEGORIES_BY_OWNER_ID = """
+    SELECT id, owner_id, name, {category_amount}, is_active, description
+    FROM category
+    WHERE owner_id = %(owner_id)s AND is_active IS true
+    ORDER BY id;
+"""
+
+ADD_SUBCARD = """
+    INSERT INTO subcard (card_id, category_id, amount, description, is_active)
+    VALUES (%(card_id)s, %(category_id)s, 0, %(description)s, true)
+    RETURNING id;
+"""
+
+GET_SUBCARD_BY_CARD_ID_AND_CATEGORY_ID = """
+    SELECT id, card_id, category_id, amount, description, is_active
+    FROM subcard
+    WHERE card_id = %(card_id)s AND category_id = %(category_id)s;
+"""
+
+INC_MONEY_TO_SUBCARD = """
+    SELECT inc_money_to_subcard_fn(%(card_id)s, %(category_id)s, %(inc_amount)s, %(description)s);
+"""
+
+DEC_MONEY_FROM_SUBCARD = """
+    SELECT dec_money_from_subcard_fn(%(card_id)s, %(category_id)s, %(dec_amount)s, %(description)s);
+"""
+
+INC_MONEY_BY_DISTRIBUTION = """
+    INSERT INTO transaction (card_id_from, category_id_from, card_id_to, category_id_to, amount, description)
+    SELECT NULL, NULL, %(card_id)s, d.category_id, d.amount, %(description)s
+    FROM unnest(%(category_ids)s::int8[], %(amounts)s::numeric[]) AS d(category_id, amount);
+
+    INSERT INTO subcard (card_id, category_id, amount, description, is_active)
+    SELECT %(card_id)s, d.category_id, d.amount, '', true
+    FROM unnest(%(category_ids)s::int8[], %(amounts)s::numeric[]) AS d(category_id, amount)
+    ON CONFLICT (card_id, category_id) DO UPDATE
+    SET amount = subcard.amount + EXCLUDED.amount;
+"""
+
+INC_MONEY_TO_SUBCARDS = """
+    WITH deposit AS (
+        SELECT *
+        FROM unnest(%(card_ids)s::int8[], %(category_ids)s::int8[], %(amounts)s::numeric[], %(descriptions)s::text[])
+            WITH ORDINALITY AS d (card_id, category_id, amount, description, position)
+    ),
+    updated AS (
+        UPDATE subcard s
+        SET amount = s.amount + m.amount
+        FROM (
+            SELECT card_id, category_id, sum(amount) AS amount
+            FROM deposit
+            GROUP BY card_id, category_id
+            ORDER BY card_id, category_id
+        ) AS m
+        WHERE s.card_id = m.card_id AND s.category_id = m.category_id
+        RETURNING s.card_id, s.category_id
+    ),
+    logged AS (
+        INSERT INTO transaction (card_id_from, category_id_from, card_id_to, category_id_to, amount, description)
+        SELECT NULL, NULL, d.card_id, d.category_id, d.amount, d.description
+        FROM deposit d
+        JOIN updated u ON u.card_id = d.card_id AND u.category_id = d.category_id
+        ORDER BY d.position
+    )
+    SELECT d.position
+    FROM deposit d
+    JOIN updated u ON u.card_id = d.card_id AND u.category_id = d.category_id;
+"""
+
+ADD_TEMPLATE = """
+    INSERT INTO template (owner_id, percents, description)
+    VALUES (%(owner_id)s, %(percents)s, %(description)s)
+    RETURNING id;
+"""
+
+GET_TEMPLATES_BY_OWNER_ID = """
+    SELECT id, owner_id, percents, description
+    FROM template
+    WHERE owner_id = %(owner_id)s
+    ORDER BY id;
+"""
+
+DELETE_TEMPLATE_BY_ID = """
+    DELETE FROM template WHERE id = %(id)s;
+"""
+
+GET_TEMPLATE_BY_ID = """
+    SELECT id, owner_id, percents, description
+    FROM template
+    WHERE id = %(id)s;
+"""
+
+GET_TEMPLATES_BY_IDS = """
+    SELECT id, owner_id, percents, description
+    FROM template
+    WHERE id = ANY(%(ids)s::int8[])
+    ORDER BY id;
+"""
+
+CHANGE_TEMPLATE_BY_ID = """
+    UPDATE template
+    SET percents = %(percents)s, description = %(description)s
+    WHERE id = %(id)s;
+"""
+
+CHANGE_USER_BY_ID = """
+    UPDATE "user"
+    SET password_hash = %(password_hash)s, password_salt = %(password_salt)s, name = %(name)s
+    WHERE id = %(id)s;
+"""
+
+GET_INACTIVE_CATEGORIES_BY_OWNER_ID = """
+    SELECT id, owner_id, name, {category_amount}, is_active, description
+    FROM category
+    WHERE owner_id = %(owner_id)s AND is_active IS false
+    ORDER BY id;
+"""
+
+DEACTIVATE_CATEGORY_BY_ID = """
+    UPDATE category
+    SET is_active = false
+    WHERE id = %(id)s;
+"""
+
+REACTIVATE_CATEGORY_BY_ID = """
+    UPDATE category
+    SET is_active = true
+    WHERE id = %(id)s;
+"""
+
+CHANGE_CATEGORY_BY_ID = """
+    UPDATE category
+    SET name = %(name)s, description = %(description)s
+    WHERE id = %(id)s;
+"""
+
+CHANGE_CARD_BY_ID = """
+    UPDATE card
+    SET name = %(name)s, description = %(description)s
+    WHERE id = %(id)s;
+"""
+
+DEACTIVATE_SUBCARD_BY_ID = """
+    UPDATE subcard
+    SET is_active = false
+    WHERE id = %(id)s;
+"""
+
+REACTIVATE_SUBCARD_BY_ID = """
+    UPDATE subcard
+    SET is_active = true
+    WHERE id = %(id)s;
+"""
+
+GET_ACTIVE_SUBCARDS_BY_CARD_ID = """
+    SELECT id, card_id, category_id, amount, description, is_active
+    FROM subcard
+    WHERE card_id = %(card_id)s
+      AND is_active IS true;
+"""
+
+TRANSFER_MONEY_BETWEEN_SUBCARDS = """
+    SELECT transfer_money_between_subcards_fn(%(card_id_from)s, %(category_id_from)s, %(card_id_to)s, %(category_id_to)s,
+                                              %(change_amount)s, %(description)s);
+"""
+
+GET_ALL_TRANSACTIONS_BY_CARD_ID = """
+    SELECT id, timestamptz, card_id_from, card_id_to, category_id_from, category_id_to, amount, description
+    FROM transaction
+    WHERE card_id_from = %(card_id)s
+    UNION ALL
+    SELECT id, timestamptz, card_id_from, card_id_to, category_id_from, category_id_to, amount, description
+    FROM transaction
+    WHERE card_id_to = %(card_id)s
+      AND card_id_from IS DISTINCT FROM %(card_id)s;
+"""
+
+GET_TIME_BOUND_TRANSACTIONS_BY_CARD_ID = """
+    SELECT id, timestamptz, card_id_from, card_id_to, category_id_from, category_id_to, amount, description
+    FROM transaction
+    WHERE card_id_from = %(card_id)s
+      AND timestamptz BETWEEN %(time_from)s AND %(time_to)s
+    UNION ALL
+    SELECT id, timestamptz, card_id_from, card_id_to, category_id_from, category_id_to, amount, description
+    FROM transaction
+    WHERE card_id_to = %(card_id)s
+      AND card_id_from IS DISTINCT FROM %(card_id)s
+      AND timestamptz BETWEEN %(time_from)s AND %(time_to)s;
+"""
+
+GET_ALL_TRANSACTIONS_BY_CATEGORY_ID = """
+    SELECT id, timestamptz, card_id_from, card_id_to, category_id_from, category_id_to, amount, description
+    FROM transaction
+    WHERE category_id_from = %(category_id)s
+    UNION ALL
+    SELECT id, timestamptz, card_id_from, card_id_to, category_id_from, category_id_to, amount, description
+    FROM transaction
+    WHERE category_id_to = %(category_id)s
+      AND category_id_from IS DISTINCT FROM %(category_id)s;
+"""
+
+GET_TIME_BOUND_TRANSACTIONS_BY_CATEGORY_ID = """
+    SELECT id, timestamptz, card_id_from, card_id_to, category_id_from, category_id_to, amount, description
+    FROM transaction
+    WHERE category_id_from = %(category_id)s
+      AND timestamptz BETWEEN %(time_from)s AND %(time_to)s
+    UNION ALL
+    SELECT id, timestamptz, card_id_from, card_id_to, category_id_from, category_id_to, amount, description
+    FROM transaction
+    WHERE category_id_to = %(category_id)s
+      AND category_id_from IS DISTINCT FROM %(category_id)s
+      AND timestamptz BETWEEN %(time_from)s AND %(time_to)s;
+"""
+
+GET_TRANSACTIONS_PAGE = """
+    (SELECT id, timestamptz, card_id_from, card_id_to, category_id_from, category_id_to, amount, description
+     FROM transaction
+     WHERE {column_from} = %(entity_id)s {after}
+     ORDER BY timestamptz DESC, id DESC
+     LIMIT %(limit)s)
+    UNION ALL
+    (SELECT id, timestamptz, card_id_from, card_id_to, category_id_from, category_id_to, amount, description
+     FROM transaction
+     WHERE {column_to} = %(entity_id)s AND {column_from} IS DISTINCT FROM %(entity_id)s {after}
+     ORDER BY timestamptz DESC, id DESC
+     LIMIT %(limit)s)
+    ORDER BY timestamptz DESC, id DESC
+    LIMIT %(limit)s;
+"""
+
+TRANSACTIONS_PAGE_AFTER_CURSOR = "AND (timestamptz, id) < (%(cursor_timestamptz)s, %(cursor_id)s)"
+
+STREAM_TRANSACTIONS = """
+    SELECT id, timestamptz, card_id_from, card_id_to, category_id_from, category_id_to, amount, description
+    FROM transaction
+    WHERE {column_from} = %(entity_id)s
+    UNION ALL
+    SELECT id, timestamptz, card_id_from, card_id_to, category_id_from, category_id_to, amount, description
+    FROM transaction
+    WHERE {column_to} = %(entity_id)s
+      AND {column_from} IS DISTINCT FROM %(entity_id)s
+    ORDER BY timestamptz, id;
+"""
+
+COLLECT_CATEGORY_MONEY_ON_ONE_SUBCARD = """
+    WITH target AS (
+        SELECT s.id, c.owner_id
+        FROM subcard s
+        JOIN card c ON c.id = s.card_id
+        WHERE s.card_id = %(card_id)s AND s.category_id = %(category_id)s
+    ), source AS (
+        SELECT s.id, s.card_id, s.amount
+        FROM subcard s
+        JOIN card c ON c.id = s.card_id
+        JOIN target t ON t.owner_id = c.owner_id
+        WHERE s.category_id = %(category_id)s
+          AND s.card_id <> %(card_id)s
+          AND c.is_active IS true
+          AND s.amount > 0
+        FOR UPDATE OF s
+    ), moved AS (
+        UPDATE subcard s
+        SET amount = s.amount - source.amount
+        FROM source
+        WHERE s.id = source.id
+        RETURNING source.card_id, source.amount
+    ), logged AS (
+        INSERT INTO transaction (card_id_from, category_id_from, card_id_to, category_id_to, amount, description)
+        SELECT moved.card_id, %(category_id)s, %(card_id)s, %(category_id)s, moved.amount, %(description)s
+        FROM moved
+    ), collected AS (
+        UPDATE subcard
+        SET amount = amount + (SELECT sum(amount) FROM moved)
+        WHERE id = (SELECT id FROM target)
+          AND EXISTS (SELECT 1 FROM moved)
+    )
+    SELECT moved.card_id, moved.amount
+    FROM target
+    LEFT JOIN moved ON true
+    ORDER BY moved.card_id;
+"""
+
+CREATE_TRANSACTION_IMPORT = """
+    CREATE TEMP TABLE transaction_import (
+        line              int8             generated always as identity,
+        timestamptz       timestamptz,
+        card_id_from      int8,
+        category_id_from  int8,
+        card_id_to        int8,
+        category_id_to    int8,
+        amount            numeric(30, 2),
+        description       text
+    ) ON COMMIT DROP;
+"""
+
+COPY_TRANSACTION_IMPORT = """
+    COPY transaction_import (timestamptz, card_id_from, category_id_from, card_id_to, category_id_to, amount, description)
+    FROM STDIN
+"""
+
+ANALYZE_TRANSACTION_IMPORT = """
+    ANALYZE transaction_import;
+"""
+
+GET_INVALID_TRANSACTION_IMPORT_ROWS = """
+    SELECT line, error
+    FROM (
+        SELECT i.line,
+               CASE
+                   WHEN i.amount IS NULL OR i.amount <= 0 THEN 'amount must be positive'
+                   WHEN i.card_id_from IS NULL AND i.card_id_to IS NULL THEN 'neither subcard_from nor subcard_to is set'
+                   WHEN (i.card_id_from IS NULL) <> (i.category_id_from IS NULL) THEN 'card_id_from and category_id_from must be set together'
+                   WHEN (i.card_id_to IS NULL) <> (i.category_id_to IS NULL) THEN 'card_id_to and category_id_to must be set together'
+                   WHEN i.card_id_from IS NOT NULL AND sf.id IS NULL THEN 'subcard_from not found'
+                   WHEN i.card_id_to IS NOT NULL AND st.id IS NULL THEN 'subcard_to not found'
+               END AS error
+        FROM transaction_import i
+        LEFT JOIN subcard sf ON sf.card_id = i.card_id_from AND sf.category_id = i.category_id_from
+        LEFT JOIN subcard st ON st.card_id = i.card_id_to AND st.category_id = i.category_id_to
+    ) AS checked
+    WHERE error IS NOT NULL
+    ORDER BY line
+    LIMIT %(limit)s;
+"""
+
+INSERT_TRANSACTION_IMPORT = """
+    INSERT INTO transaction (timestamptz, card_id_from, category_id_from, card_id_to, category_id_to, amount, description)
+    SELECT coalesce(timestamptz, now()), card_id_from, category_id_from, card_id_to, category_id_to, amount, description
+    FROM transaction_import
+    ORDER BY line;
+"""
+
+APPLY_TRANSACTION_IMPORT_DELTAS = """
+    UPDATE subcard s
+    SET amount = s.amount + d.delta
+    FROM (
+        SELECT card_id, category_id, sum(delta) AS delta
+        FROM (
+            SELECT card_id_to, category_id_to, amount FROM transaction_import WHERE card_id_to IS NOT NULL
+            UNION ALL
+            SELECT card_id_from, category_id_from, -amount FROM transaction_import WHERE card_id_from IS NOT NULL
+        ) AS moves (card_id, category_id, delta)
+        GROUP BY card_id, category_id
+        ORDER BY card_id, category_id
+    ) AS d
+    WHERE s.card_id = d.card_id AND s.category_id = d.category_id
+    RETURNING s.card_id, s.category_id;
+"""
+
+DROP_TRANSACTION_IMPORT = """
+    DROP TABLE transaction_import;
+"""
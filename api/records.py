@@ -0,0 +1,53 @@
+"""
+Записи - строки результата функций API: namedtuple с именами полей, которыми пользуется фронтенд (card_id, card_name, ...),
+вместо голых кортежей. Запись остаётся кортежем (индексы, распаковка и row[0] работают как раньше), а кроме атрибутов
+поддерживает доступ по ключу (row['card_name']), keys() и items(), как словарь: шаблоны Jinja и фронтенд принимают её
+без перекладывания в dict. Записи неизменяемы, поэтому их безопасно держать в кэшах api.
+
+Строит записи сам курсор: Database/AsyncDatabase получают класс записи аргументом record в fetch_*/stream.
+"""
+import collections
+from typing import Any, Dict, Iterable
+
+
+class Record:
+    """
+    Примесь к namedtuple: доступ по имени поля через [], как у словаря. Целые индексы и срезы - как у кортежа.
+    """
+    __slots__ = ()
+    _index: Dict[str, int] = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key]) # KeyError на неизвестное поле, как у словаря
+        return tuple.__getitem__(self, key)
+
+    def get(self, key: str, default: Any = None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self):
+        return self._fields
+
+    def items(self):
+        return zip(self._fields, self)
+
+
+def record(name: str, fields: Iterable[str]) -> type:
+    """Класс записи name с полями fields (namedtuple + Record)."""
+    base = collections.namedtuple(name, fields)
+    return type(name, (Record, base), {"__slots__": (), "_index": {field: i for i, field in enumerate(base._fields)}})
+
+
+UserRecord = record("UserRecord", ["user_id", "login", "password_hash", "password_salt", "name"])
+UserIdentityRecord = record("UserIdentityRecord", ["user_id", "login", "name"])
+CardRecord = record("CardRecord", ["card_id", "owner_id", "card_name", "amount", "is_active", "description"])
+CategoryRecord = record("CategoryRecord", ["category_id", "owner_id", "category_name", "amount", "is_active", "description"])
+SubcardRecord = record("SubcardRecord", ["subcard_id", "card_id", "category_id", "amount", "description", "is_active"])
+TemplateRecord = record("TemplateRecord", ["template_id", "owner_id", "percents", "description"])
+TransactionRecord = record("TransactionRecord", [
+    "transaction_id", "timestamptz", "card_id_from", "card_id_to", "category_id_from", "category_id_to", "amount", "description"])
+
+# строка get_active_cards_overview_by_owner_id: карта и одна её субкарта (поля субкарты None, если у карты их нет)
+CardOverviewRowRecord = record("CardOverviewRowRecord", list(CardRecord._fields) + [
+    "subcard_id", "category_id", "subcard_amount", "subcard_description", "category_name"])
@@ -0,0 +1,2 @@
+create index transaction_card_id_from_idx on transaction (card_id_from);
+create index transaction_card_id_to_idx   on transaction (card_id_to);
@@ -0,0 +1,4 @@
+drop index transaction_card_id_from_timestamptz_id_idx;
+drop index transaction_card_id_to_timestamptz_id_idx;
+drop index transaction_category_id_from_timestamptz_id_idx;
+drop index transaction_category_id_to_timestamptz_id_idx;
@@ -0,0 +1,3 @@
+drop function transfer_money_between_subcards_fn(int8, int8, int8, int8, numeric, text);
+drop function dec_money_from_subcard_fn(int8, int8, numeric, text);
+drop function inc_money_to_subcard_fn(int8, int8, numeric, text);
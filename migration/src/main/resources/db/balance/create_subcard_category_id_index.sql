@@ -0,0 +1,2 @@
+-- сумма категории при чтении собирается по subcard.category_id
+create index subcard_category_id_idx on subcard (category_id);
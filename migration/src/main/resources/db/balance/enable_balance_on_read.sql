@@ -0,0 +1,22 @@
+-- режим balance_on_read: суммы карт и категорий считаются при чтении из subcard (balance_mode = "on_read" в api/config.py),
+-- триггер больше не обновляет строки card/category, поэтому параллельные зачисления на разные карты
+-- не выстраиваются в очередь за блокировкой одной строки category
+create or replace function add_amount_from_subcard_to_card_and_category_fn()
+    returns trigger
+    language plpgsql
+as $$
+begin
+    if TG_OP = 'UPDATE' then
+        -- запрещаем менять связи
+        if NEW.card_id <> OLD.card_id then
+            raise exception 'Changing card_id in subcard is not allowed';
+        end if;
+
+        if NEW.category_id <> OLD.category_id then
+            raise exception 'Changing category_id in subcard is not allowed';
+        end if;
+    end if;
+
+    return NEW;
+end;
+$$;
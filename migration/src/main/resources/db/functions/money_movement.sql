@@ -0,0 +1,96 @@
+-- перемещение денег одним вызовом: проверка суммы и субкарт, изменение баланса и запись в лог транзакций.
+-- функции возвращают код результата вместо исключения, чтобы вызывающий код различал причины отказа:
+--   0 - успех
+--   1 - сумма не положительна (или null)
+--   2 - нет субкарты (card_id, category_id), для перевода - субкарты-источника
+--   3 - нет субкарты-получателя (только перевод)
+-- при кодах 1-3 база не изменяется. Суммы card/category пересчитывает триггер на subcard.
+
+create or replace function inc_money_to_subcard_fn(p_card_id int8, p_category_id int8, p_amount numeric, p_description text)
+    returns int
+    language plpgsql
+as $$
+begin
+    if p_amount is null or p_amount <= 0 then
+        return 1;
+    end if;
+
+    update subcard
+    set amount = amount + p_amount
+    where card_id = p_card_id and category_id = p_category_id;
+
+    if not found then
+        return 2;
+    end if;
+
+    insert into transaction (card_id_from, category_id_from, card_id_to, category_id_to, amount, description)
+    values (null, null, p_card_id, p_category_id, p_amount, p_description);
+
+    return 0;
+end;
+$$;
+
+create or replace function dec_money_from_subcard_fn(p_card_id int8, p_category_id int8, p_amount numeric, p_description text)
+    returns int
+    language plpgsql
+as $$
+begin
+    if p_amount is null or p_amount <= 0 then
+        return 1;
+    end if;
+
+    update subcard
+    set amount = amount - p_amount
+    where card_id = p_card_id and category_id = p_category_id;
+
+    if not found then
+        return 2;
+    end if;
+
+    insert into transaction (card_id_to, category_id_to, card_id_from, category_id_from, amount, description)
+    values (null, null, p_card_id, p_category_id, p_amount, p_description);
+
+    return 0;
+end;
+$$;
+
+create or replace function transfer_money_between_subcards_fn(p_card_id_from int8, p_category_id_from int8,
+                                                              p_card_id_to int8, p_category_id_to int8,
+                                                              p_amount numeric, p_description text)
+    returns int
+    language plpgsql
+as $$
+begin
+    if p_amount is null or p_amount <= 0 then
+        return 1;
+    end if;
+
+    -- блокируем обе субкарты в одном порядке, чтобы встречные переводы не взаимоблокировались
+    perform 1
+    from subcard
+    where (card_id, category_id) in ((p_card_id_from, p_category_id_from), (p_card_id_to, p_category_id_to))
+    order by card_id, category_id
+    for update;
+
+    if not exists (select 1 from subcard where card_id = p_card_id_from and category_id = p_category_id_from) then
+        return 2;
+    end if;
+
+    if not exists (select 1 from subcard where card_id = p_card_id_to and category_id = p_category_id_to) then
+        return 3;
+    end if;
+
+    update subcard
+    set amount = amount - p_amount
+    where card_id = p_card_id_from and category_id = p_category_id_from;
+
+    update subcard
+    set amount = amount + p_amount
+    where card_id = p_card_id_to and category_id = p_category_id_to;
+
+    insert into transaction (card_id_from, category_id_from, card_id_to, category_id_to, amount, description)
+    values (p_card_id_from, p_category_id_from, p_card_id_to, p_category_id_to, p_amount, p_description);
+
+    return 0;
+end;
+$$;
@@ -0,0 +1,5 @@
+-- индексы для постраничной (keyset) выдачи истории транзакций: фильтр по карте/категории + порядок (timestamptz, id)
+create index transaction_card_id_from_timestamptz_id_idx     on transaction (card_id_from, timestamptz, id);
+create index transaction_card_id_to_timestamptz_id_idx       on transaction (card_id_to, timestamptz, id);
+create index transaction_category_id_from_timestamptz_id_idx on transaction (category_id_from, timestamptz, id);
+create index transaction_category_id_to_timestamptz_id_idx   on transaction (category_id_to, timestamptz, id);
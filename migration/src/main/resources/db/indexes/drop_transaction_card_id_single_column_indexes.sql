@@ -0,0 +1,4 @@
+-- одноколоночные индексы по card_id_from/card_id_to покрыты префиксом составных индексов (card_id_*, timestamptz, id) из v.1.1,
+-- лишние индексы только замедляют запись в лог транзакций
+drop index transaction_card_id_from_idx;
+drop index transaction_card_id_to_idx;
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, g
 from flask_login import (
     LoginManager, UserMixin, login_user, logout_user,
     login_required, current_user
@@ -7,9 +7,14 @@ from flask_login import (
 import hashlib, os
 import sys
 import json
+import csv, io
+import logging, random
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from api import api
+from api import db as api_db
+from api import metrics as api_metrics
+from api.loader import RequestLoaders
 
 app = Flask(__name__)
 app.secret_key = "super_secret_key"
@@ -17,6 +22,17 @@ app.secret_key = "super_secret_key"
 login_manager = LoginManager(app)
 login_manager.login_view = "login"
 
+log = logging.getLogger("smart_banking.front")
+# доля отладочных сообщений горячих путей, которые попадают в лог при уровне DEBUG (строки из БД на каждый запрос)
+log_sample_rate = float(os.environ.get("SMART_BANKING_LOG_SAMPLE_RATE", "0.01"))
+# один и тот же запрос к БД чаще этого за HTTP запрос - предупреждение о N+1
+query_repeat_limit = int(os.environ.get("SMART_BANKING_QUERY_REPEAT_LIMIT", "5"))
+
+def debug_sampled(msg, *args):
+    """log.debug только для доли log_sample_rate вызовов; аргументы форматируются, лишь если сообщение пишется."""
+    if log.isEnabledFor(logging.DEBUG) and random.random() < log_sample_rate:
+        log.debug(msg, *args)
+
 
 
 # ----------------------------
@@ -44,14 +60,6 @@ class User(UserMixin):
 
 users = []
 
-cards_columns = ["card_id", "owner_id", "card_name", "amount", "is_active", "description"]
-
-def turple_cards_to_dict(data):
-    return dict(zip(cards_columns, data))
-
-def turples_cards_to_dicts(data):
-    return [turple_cards_to_dict(row) for row in data]
-
 cards = [
     {"card_id": 1, "card_number": "1234-5678-9012-3456", "money_amount": 10500, "owner_id": 1, },
     {"card_id": 2, "card_number": "9999-8888-7777-6666", "money_amount": 230, "owner_id": 1},
@@ -61,14 +69,6 @@ cards = [
 
 
 
-subcards_columns = ["subcard_id", "card_id", "category_id", "amount", "description", "is_active"]
-
-def turple_subcards_to_dict(data):
-    return dict(zip(subcards_columns, data))
-
-def turples_subcards_to_dicts(data):
-    return [turple_subcards_to_dict(row) for row in data]
-
 subcards = [
     {"card_id": 1, "category_id": 1, "amount": 100},
     {"card_id": 1, "category_id": 2, "amount": 200}
@@ -82,14 +82,6 @@ books = [
 ]
 
 
-categories_columns = ['category_id', 'owner_id', 'category_name', 'amount', 'is_active','description']
-
-def turple_categories_to_dict(data):
-    return dict(zip(categories_columns, data))
-
-def turples_categories_to_dicts(data):
-    return [turple_categories_to_dict(row) for row in data]
-
 categories = [
     {"category_id": 0, "category_name": "Общее", "owner_id": 1, "description": "1"},
     {"category_id": 1, "category_name": "eda", "owner_id": 1, "description": "2"},
@@ -97,15 +89,6 @@ categories = [
 ]
 
 
-templates_columns = ["template_id", "owner_id", "percents", "description"]
-
-def turple_templates_to_dict(data):
-    return dict(zip(templates_columns, data))
-
-def turples_templates_to_dicts(data):
-    return [turple_templates_to_dict(row) for row in data]
-
-
 templates = [
     {"template_id": 1, "owner_id": 1, "percents": {0: 50, 1: 30, 2: 20}, "description":""},
     {"template_id": 2, "owner_id": 1, "percents": {0: 100}, "description":"Мой шаблон"},
@@ -113,6 +96,13 @@ templates = [
 ]
 
 
+transactions_columns = api.records.TransactionRecord._fields
+
+# карта со списком субкарт для страницы /cards (строки api - записи api.records с доступом и по ключу, и по атрибуту)
+CardOverview = api.records.record("CardOverview", list(api.records.CardRecord._fields) + ["subcards"])
+SubcardOverview = api.records.record("SubcardOverview", list(api.records.SubcardRecord._fields) + ["category_name"])
+
+
 # ----------------------------
 #   Утилиты для хеширования
 # ----------------------------
@@ -128,12 +118,20 @@ def hash_password(password, salt):
 def user_by_id(user_id):
 
     data = api.get_user_by_id(user_id)
-    print("юзер по id", user_id, data)
+    debug_sampled("юзер по id %s: %s", user_id, data)
     if not data:
         return None
     
     return User(*data)
 
+def user_identity_by_id(user_id):
+    """Пользователь для Flask-Login без хеша пароля; строка берётся из короткоживущего кэша api, а не из БД на каждый запрос."""
+    data = api.get_user_identity_by_id(user_id)
+    if not data:
+        return None
+    user_id, login, name = data
+    return User(user_id, login, None, None, name)
+
 def add_user_to_db(user):
     users.append(user)
 
@@ -146,7 +144,7 @@ def create_user(login, name, password):
 
     ret = api.add_user(login=login, password_hash=password_hash, password_salt=salt, name=name)                     # <<<<<<###############
 
-    print(ret)
+    log.info("новый пользователь %s", ret)
 
     return ret
 
@@ -156,7 +154,7 @@ def is_login_exist(login_name):
 
 def user_by_login(login):
     data = api.get_user_by_login(login)
-    print(login, data)
+    debug_sampled("юзер по логину %s: %s", login, data)
 
     if not data:
         return None
@@ -167,7 +165,7 @@ def user_by_login(login):
 def add_category_to_db(new_category):
 
     data = api.add_category(owner_id=new_category["owner_id"], name=new_category["category_name"], description=new_category["description"])
-    print(data)
+    log.info("новая категория %s", data)
     categories.append(data)
 
 
@@ -175,24 +173,38 @@ def add_category_to_db(new_category):
 
 def user_categories(current_user):
     data = api.get_active_categories_by_owner_id((current_user.id))
-    print("Категории юзера", data)
-    result = turples_categories_to_dicts(data)
-    return result
+    debug_sampled("категории юзера %s", data)
+    return data or []
 
     #return [{k: v for k, v in c.items() if k not in {"owner_id"}} for c in categories if c["owner_id"] == current_user.id]
 
 
+def loaders():
+    """
+    Загрузчики карт/категорий/шаблонов текущего HTTP запроса (api.loader): хелперы *_by_id ниже берут строки через них,
+    поэтому id, запрошенные за запрос (в том числе из Jinja шаблонов), уходят в БД пачкой и не запрашиваются дважды.
+    """
+    if "loaders" not in g:
+        g.loaders = RequestLoaders()
+    return g.loaders
+
+
 def category_by_id(category_id):
-    data = turple_categories_to_dict(api.get_category_by_id(int(category_id)))
-    print(data["category_name"])
-    return data
+    return loaders().categories.load(category_id)
 
 
 @app.route("/category_by_id/<int:category_id>", methods=['GET', 'POST'])
 def category_by_id_api(category_id):
-    data = turple_categories_to_dict(api.get_category_by_id(int(category_id)))
-    print(data["category_name"])
-    return jsonify(data)
+    data = category_by_id(category_id)
+    if not data:
+        return jsonify({"error": "Категория не найдена"}), 404
+    return jsonify(data._asdict())
+
+
+def categories_by_ids_api(category_ids):
+    """Категории одним запросом: {category_id: категория}."""
+    rows = loaders().categories.load_many(category_ids)
+    return {c.category_id: c for c in rows if c}
 
 
 def change_category(category, new_name, new_description):
@@ -205,39 +217,53 @@ def delete_category_api(category):
 
 def user_cards_api(current_user):
     data = api.get_active_cards_by_owner_id(current_user.id)
-    print("Карты юзера", data)
+    debug_sampled("карты юзера %s", data)
 
-    return turples_cards_to_dicts(data)
+    return data or []
 
 
 def subcards_by_card_id(card_id):
     data = api.get_active_subcards_by_card_id(card_id)
 
-    print("сабкарты", data)
-    card_subcards = turples_subcards_to_dicts(data)
-    print("сабкарты словари", card_subcards)
-    return card_subcards
+    debug_sampled("сабкарты %s", data)
+    return data or []
+
+
+def user_cards_overview_api(current_user):
+    """Карты пользователя с вложенным списком субкарт (и названиями категорий) для страницы /cards — один запрос к БД."""
+    data = api.get_active_cards_overview_by_owner_id(current_user.id)
+    overview = []
+    card_by_id = {}
+    for row in data or []:
+        if row.card_id not in card_by_id:
+            card = CardOverview(*row[:6], subcards=[])
+            card_by_id[row.card_id] = card
+            overview.append(card)
+        if row.subcard_id is not None:
+            card_by_id[row.card_id].subcards.append(SubcardOverview(
+                row.subcard_id, row.card_id, row.category_id, row.subcard_amount, row.subcard_description, True, row.category_name))
+    return overview
 
 
 def card_categories_api(card_id):
-    data = api.get_active_subcards_by_card_id(card_id)
-    card_subcards = turples_subcards_to_dicts(data)
-    print("сабкарты словари", card_subcards)
+    card_subcards = api.get_active_subcards_by_card_id(card_id) or []
+    debug_sampled("сабкарты карты %s: %s", card_id, card_subcards)
+    loaders().categories.want(s['category_id'] for s in card_subcards)
     return [category_by_id(s['category_id']) for s in card_subcards]
 
 
 def cards_categories_api(user_cards, subcards):
+    loaders().categories.want(s['category_id'] for s in subcards)
     return {c['card_id']: {category_by_id(s['category_id'])['category_name']: s['money_amount'] for s in subcards if s['card_id'] == c['card_id']} for c in user_cards} 
 
 
 def card_by_id_api(card_id):
-    return turple_cards_to_dict(api.get_card_by_id(card_id))
+    return loaders().cards.load(card_id)
 
 
 def add_card_api(card_name, description, current_user):
-    print("Аргументы новой карты:", card_name, description, current_user.id)
     new_card = api.add_card(owner_id=current_user.id, name=card_name, description=description)
-    print("добавленная карта", new_card)
+    log.info("новая карта %s пользователя %s", new_card, current_user.id)
     return new_card
 
 
@@ -251,54 +277,97 @@ def add_subcard_api(card_id, category_id, description):
 
 
 def subcard_by_card_and_category_id_api(card_id, category_id):
-    data = api.get_subcard_by_card_id_and_category_id(card_id=card_id, category_id=category_id)
-    return turple_subcards_to_dict(data)
+    return api.get_subcard_by_card_id_and_category_id(card_id=card_id, category_id=category_id)
 
 
 def subcard_balance_inc(subcard, change):
     api.inc_money_to_subcard(card_id=subcard['card_id'], category_id=subcard['category_id'], inc_amount=change, description='')
 
 
+def card_balance_inc_by_distribution(card_id, distributed_amounts):
+    """Зачисление сразу на несколько категорий карты одной SQL транзакцией; нулевые суммы пропускаются."""
+    amounts = {category_id: amount for category_id, amount in distributed_amounts.items() if amount > 0}
+    if not amounts:
+        return True
+    return api.inc_money_by_distribution(card_id, amounts, '')
+
+
 def subcard_balance_dec(subcard, change):
     api.dec_money_from_subcard(card_id=subcard['card_id'], category_id=subcard['category_id'], dec_amount=change, description='')
 
 
 def is_subcard_exist(card_id, category_id):
-    data = api.get_subcard_by_card_id_and_category_id(card_id, category_id)
+    data = api.get_subcard_by_card_id_and_category_id(card_id=card_id, category_id=category_id)
     return data is not None
 
 
 def user_templates_api(current_user):
     data = api.get_templates_by_owner_id(current_user.id)
-    print(data)
+    debug_sampled("шаблоны юзера %s", data)
 
-    data = turples_templates_to_dicts(data)
+    loaders().templates.prime(data or [])
+    data = data or []
+    # страницы выводят названия категорий шаблонов через category_by_id - загрузим их одним запросом
+    loaders().categories.want(category_id for t in data for category_id in t['percents'])
     return data
 
 
 def template_by_id_api(template_id):
-    data = api.get_template_by_id(template_id)
-    print("шаблон по ид\n\n\n\n", template_id, data)
-    return turple_templates_to_dict(data)
+    data = loaders().templates.load(template_id)
+    debug_sampled("шаблон по id %s: %s", template_id, data)
+    if not data:
+        return None
+    loaders().categories.want(data.percents)
+    return data
 
 
 def add_template_api(percents, current_user, description=""):
     percents = json.dumps({str(k): v for k, v in percents.items()})
-    print("проценты", percents)
     new_template = api.add_template(owner_id=current_user.id, percents=percents, description=description)
-    print(new_template)
+    log.info("новый шаблон %s: %s", new_template, percents)
     return new_template
 
 
 def update_template_api(template, new_percents, template_description):
     data = api.change_template_by_id(id=template['template_id'], percents=json.dumps({str(k): v for k, v in new_percents.items()}), description=template_description)
-    print(data)
+    log.info("шаблон %s изменён: %s", template['template_id'], data)
 
 
 def delete_template_api(template):
     templates.remove(template)
 
 
+export_chunk_rows = 1000
+export_mimetypes = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def transactions_export_chunks(rows, fmt):
+    """Превращает поток строк истории в куски текста CSV/NDJSON по export_chunk_rows строк - память не зависит от длины истории."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(transactions_columns)
+    count = 0
+    for row in rows:
+        if fmt == "csv":
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row._asdict(), default=str, ensure_ascii=False) + "\n")
+        count += 1
+        if count % export_chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def transactions_export_response(rows, fmt, filename):
+    return Response(
+        stream_with_context(transactions_export_chunks(rows, fmt)),
+        mimetype=export_mimetypes[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}.{fmt}"},
+    )
+
+
 def validate_percents(percents_dict):
     """Проверяет, что сумма процентов равна 100"""
     return sum(percents_dict.values()) == 100
@@ -306,13 +375,61 @@ def validate_percents(percents_dict):
 
 
 
+# ----------------------------
+#   Чтение с реплики: read-your-writes в пределах запроса
+# ----------------------------
+
+@app.before_request
+def begin_read_your_writes():
+    # после записи в этом запросе (например, перед redirect) чтения идут в основную БД, а не в реплику
+    g.read_your_writes = api_db.begin_read_your_writes()
+
+@app.teardown_request
+def end_read_your_writes(exc):
+    token = g.pop("read_your_writes", None)
+    if token is not None:
+        api_db.end_read_your_writes(token)
+
+
+# ----------------------------
+#   Трасса запросов к БД: Server-Timing и поиск N+1
+# ----------------------------
+
+@app.before_request
+def begin_query_trace():
+    g.query_trace = api_metrics.begin_trace()
+
+@app.after_request
+def report_query_trace(response):
+    trace = api_metrics.current_trace.get()
+    if trace is None:
+        return response
+    # для потоковых ответов (экспорт) запросы, выполненные при отдаче тела, сюда уже не попадут
+    response.headers.add("Server-Timing", trace.server_timing())
+    for sql, count in trace.repeated(query_repeat_limit):
+        log.warning("N+1: %s %s выполнил запрос %d раз: %s", request.method, request.path, count, sql)
+    return response
+
+@app.teardown_request
+def end_query_trace(exc):
+    token = g.pop("query_trace", None)
+    if token is not None:
+        api_metrics.end_trace(token)
+
+
+@app.errorhandler(api.PoolOverloadedError)
+def database_overloaded(exc):
+    # все соединения с БД заняты дольше checkout_timeout - просим клиента повторить, а не показываем "не найдено"
+    return "Сервис перегружен, попробуйте ещё раз через несколько секунд.", 503, {"Retry-After": "1"}
+
+
 # ----------------------------
 #   Flask-Login callbacks
 # ----------------------------
 
 @login_manager.user_loader
 def load_user(user_id):
-    return user_by_id(user_id)
+    return user_identity_by_id(user_id)
 
 
 # ----------------------------
@@ -467,24 +584,19 @@ def list_books():
 @app.route('/cards')
 @login_required
 def list_cards():
-    user_cards = user_cards_api(current_user)                     # <<<<<<###############
+    user_cards = user_cards_overview_api(current_user)            # <<<<<<###############
 
     #cards_categories = cards_categories_api(user_cards, subcards)  # <<<<<<###############
-    return render_template('list_cards.html', title="💳 Ваши карты", items=user_cards, base_name='cards', type="dict", subcards_by_card_id=subcards_by_card_id, category_by_id=category_by_id, not_visible={"owner_id", "card_id", 'is_active'})
+    return render_template('list_cards.html', title="💳 Ваши карты", items=user_cards, base_name='cards', type="dict", not_visible={"owner_id", "card_id", 'is_active', 'subcards'})
 
 
-@app.route('/edit_card/<int:card_id>', methods=['GET', 'POST'])
+@app.route('/edit_card/<int:card_id>')
 @login_required
 def edit_card(card_id):
+    # баланс карты - сумма её субкарт: меняется переводами и зачислениями, не правкой карты, поэтому страница только показывает его
     card = card_by_id_api(card_id)                            # <<<<<<###############
     if not card:
         return "Карта не найдена", 404
-    if request.method == 'POST':
-        new_balance = request.form.get('money_amount')
-        if new_balance:
-            card["money_amount"] = new_balance
-        flash("Баланс обновлён!")
-        return redirect(url_for('list_cards'))
     return render_template('edit_card.html', base_name='cards', card=card)
 
 @app.route('/delete_card/<int:card_id>', methods=['POST'])
@@ -512,7 +624,7 @@ def add_category_to_card(card_id):
         return "Карта не найдена", 404
     if request.method == 'POST':
         category_id = request.form.get('category_id')
-        print(category_id)
+        debug_sampled("категория для субкарты карты %s: %s", card_id, category_id)
         if category_id:
             category_id = int(category_id)
 
@@ -598,7 +710,6 @@ def add_money_card_and_category(card_id, category_id):
 @app.route('/dec_money_general')
 @login_required
 def dec_money_general():
-    print("dec money")
     user_cards = user_cards_api(current_user)                             # <<<<<<###############
     
     return render_template('list_for_choice_dec_money.html', title="💳 Ваши карты", items=user_cards, base_name='cards')
@@ -638,6 +749,43 @@ def dec_money_card_and_category(card_id, category_id):
 
 
 
+#------------------- Выгрузка истории ---------------
+
+
+@app.route('/cards/<int:card_id>/transactions.<fmt>')
+@login_required
+def export_card_transactions(card_id, fmt):
+    if fmt not in export_mimetypes:
+        return "Неизвестный формат выгрузки", 404
+
+    card = api.get_card_by_id(card_id)
+    if not card:
+        return "Карта не найдена", 404
+
+    if card.owner_id != current_user.id:
+        return "Нет прав для доступа к этой карте", 403
+
+    return transactions_export_response(api.stream_transactions_by_card_id(card_id), fmt, f"card_{card_id}_transactions")
+
+
+@app.route('/categories/<int:category_id>/transactions.<fmt>')
+@login_required
+def export_category_transactions(category_id, fmt):
+    if fmt not in export_mimetypes:
+        return "Неизвестный формат выгрузки", 404
+
+    category = api.get_category_by_id(category_id)
+    if not category:
+        return "Категория не найдена", 404
+
+    if category.owner_id != current_user.id:
+        return "Нет прав для доступа к этой категории", 403
+
+    return transactions_export_response(api.stream_transactions_by_category_id(category_id), fmt, f"category_{category_id}_transactions")
+
+
+
+
 #------------------- Шаблоны ---------------
 
 
@@ -646,7 +794,6 @@ def dec_money_card_and_category(card_id, category_id):
 @login_required
 def list_templates():
     user_templates = user_templates_api(current_user)
-    print(user_templates)
     return render_template('list_of_templates.html', 
                          title="📊 Ваши шаблоны распределения", 
                          items=user_templates, category_by_id=category_by_id)
@@ -765,8 +912,6 @@ def delete_template(template_id):
 def add_money_by_template(card_id):
     card = card_by_id_api(card_id)
 
-    print(card)
-
     if not card:
         return "Карта не найдена", 404
 
@@ -818,18 +963,17 @@ def add_money_by_template(card_id):
             flash(f"Внимание: сумма по категориям ({total_from_form} руб.) не совпадает с общей ({total_amount} руб.)")
             total_amount = total_from_form  # можно скорректировать, либо оставить
 
-        # 🏦 Обновляем субкарты и баланс
-        for category_id, amount_for_category in distributed_amounts.items():
-            subcard = subcard_by_card_and_category_id_api(card_id, category_id)
-            if not subcard:
-                subcard = add_subcard_api(card_id, category_id)
-            subcard_balance_inc(subcard, amount_for_category)
+        # 🏦 Обновляем субкарты и баланс (недостающие субкарты создаются там же, всё одной транзакцией)
+        if not card_balance_inc_by_distribution(card_id, distributed_amounts):
+            flash("Не удалось зачислить деньги, попробуйте ещё раз")
+            return redirect(url_for('add_money_by_template', card_id=card_id))
 
 
         # 🧾 Формируем сообщение о распределении
         distribution_info = []
+        categories_by_id = categories_by_ids_api(distributed_amounts.keys())
         for category_id, amount in distributed_amounts.items():
-            category = category_by_id(category_id)
+            category = categories_by_id.get(int(category_id))
             category_name = category["category_name"] if category else f"Категория {category_id}"
             distribution_info.append(f"{category_name}: {amount} руб.")
 
@@ -841,7 +985,6 @@ def add_money_by_template(card_id):
 
     # GET-запрос: показать форму
     user_templates = user_templates_api(current_user)
-    print(card, user_templates)
     return render_template(
         'add_money_to_card_by_template.html',
         card=card,
@@ -849,5 +992,54 @@ def add_money_by_template(card_id):
         category_by_id=category_by_id)
 
 
+@app.route('/templates/<int:template_id>/preview')
+@login_required
+def template_preview(template_id):
+    """
+    Распределение суммы amount по шаблону - одним ответом, с названиями категорий (одним запросом к БД).
+    Части считаются методом наибольшего остатка (api.distribute_by_percents), поэтому в сумме дают ровно amount.
+    """
+    template = template_by_id_api(template_id)
+    if not template:
+        return jsonify({"error": "Шаблон не найден"}), 404
+    if template["owner_id"] != current_user.id:
+        return jsonify({"error": "Нет прав для использования этого шаблона"}), 403
+    amount = request.args.get('amount', type=int)
+    if not amount or amount <= 0:
+        return jsonify({"error": "Укажите положительную сумму"}), 400
+
+    # форма зачисления принимает целые рубли, поэтому и делим с шагом 1
+    amounts = api.distribute_by_percents(amount, template["percents"])
+    categories_by_id = categories_by_ids_api(amounts.keys())
+    distribution = []
+    for category_id, category_amount in amounts.items():
+        category = categories_by_id.get(int(category_id))
+        distribution.append({
+            "category_id": int(category_id),
+            "category_name": category["category_name"] if category else f"Категория {category_id}",
+            "percent": template["percents"][category_id],
+            "amount": category_amount,
+        })
+    return jsonify({"template_id": template_id, "amount": amount, "distribution": distribution})
+
+
+# --- Метрики для Prometheus (пул соединений, время запросов по функциям API, кэши) ---
+@app.route('/metrics')
+def metrics():
+    return Response(api.render_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+# --- Проверка живости для балансировщика: 503, пока БД недоступна ---
+@app.route('/health')
+def health():
+    # эндпоинт без входа: причина недоступности только в лог сервера, наружу - статус
+    try:
+        api.DB.ping()
+    except Exception:
+        log.exception("проверка живости: БД недоступна")
+        return "database unavailable", 503
+    return "ok"
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
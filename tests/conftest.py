@@ -0,0 +1,177 @@
+"""
+Общие фикстуры тестов.
+
+Тесты, которым нужна БД, берут фикстуру db (синхронный api) или adb (api.aio). На сессию в Postgres создаётся
+отдельная схема, в неё накатываются SQL файлы changeset'ов из migration/ в порядке changelog.xml, а api.DB и aio.ADB
+на время теста смотрят в эту схему (search_path в DSN). Данные между тестами не чистятся: каждый тест заводит
+своего пользователя (фикстура owner), поэтому тесты друг другу не мешают.
+
+DSN - переменная окружения SMART_BANKING_TEST_DSN, по умолчанию dsn из config.DEFAULTS (deployment/test).
+Если Postgres недоступен, тесты с БД пропускаются, остальные идут как обычно.
+"""
+import os
+import sys
+import uuid
+import xml.etree.ElementTree as ElementTree
+from urllib.parse import quote
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import psycopg2
+
+from api import api, config, metrics
+from api.db import Database
+
+MIGRATIONS = os.path.join(ROOT, "migration", "src", "main", "resources", "db")
+LIQUIBASE = "{http://www.liquibase.org/xml/ns/dbchangelog}"
+
+TEST_DSN = os.environ.get("SMART_BANKING_TEST_DSN", config.DEFAULTS["dsn"])
+
+
+def migration_files(contexts=()):
+    """SQL файлы changeset'ов в порядке changelog.xml; changeset'ы с context накатываются, только если он в contexts."""
+    changelog = os.path.join(MIGRATIONS, "changelog.xml")
+    for include in ElementTree.parse(changelog).getroot().iter(LIQUIBASE + "include"):
+        path = os.path.join(MIGRATIONS, include.get("file"))
+        for change_set in ElementTree.parse(path).getroot().iter(LIQUIBASE + "changeSet"):
+            if change_set.get("context") and change_set.get("context") not in contexts:
+                continue
+            for sql_file in change_set.findall(LIQUIBASE + "sqlFile"): # без вложенных в <rollback>
+                yield os.path.normpath(os.path.join(os.path.dirname(path), sql_file.get("path")))
+
+
+def create_schema(contexts=()):
+    """Новая схема с накатанными миграциями; возвращает (имя схемы, DSN с search_path на неё)."""
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    conn = psycopg2.connect(TEST_DSN)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {schema}")
+            cur.execute(f"SET search_path TO {schema}")
+            for path in migration_files(contexts):
+                with open(path, encoding="utf-8") as f:
+                    cur.execute(f.read())
+                if path.endswith("create_user.sql"):
+                    # create_user.sql ещё с одной колонкой password, а api пишет хеш и соль раздельно
+                    cur.execute('ALTER TABLE "user" DROP COLUMN password, '
+                                "ADD COLUMN password_hash text NOT NULL, ADD COLUMN password_salt text NOT NULL")
+    finally:
+        conn.close()
+    separator = "&" if "?" in TEST_DSN else "?"
+    return schema, f"{TEST_DSN}{separator}options={quote(f'-csearch_path={schema}')}"
+
+
+def drop_schema(schema):
+    conn = psycopg2.connect(TEST_DSN)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+    finally:
+        conn.close()
+
+
+@pytest.fixture(scope="session")
+def database_dsn():
+    """DSN тестовой схемы; без Postgres - пропуск теста."""
+    try:
+        psycopg2.connect(TEST_DSN, connect_timeout=3).close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL is not available at {TEST_DSN}: {e}")
+    schema, dsn = create_schema()
+    yield dsn
+    drop_schema(schema)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # кэши api общие на процесс: строка, закэшированная одним тестом, не должна отвечать за БД в другом
+    for cache in (api.USER_CACHE, api.USER_IDENTITY_CACHE, api.CARD_CACHE, api.CATEGORY_CACHE, api.TEMPLATE_CACHE):
+        cache.clear()
+    yield
+
+
+@pytest.fixture(scope="session")
+def session_database(database_dsn):
+    database = Database(database_dsn, maxconn=5, checkout_timeout=2.0)
+    yield database
+    for pool in database._pools.values():
+        pool.closeall()
+
+
+@pytest.fixture
+def db(session_database, monkeypatch):
+    """Database тестовой схемы, подставленная в api.DB."""
+    monkeypatch.setattr(api, "DB", session_database)
+    monkeypatch.setattr(api, "BALANCE_MODE", "trigger")
+    return session_database
+
+
+@pytest.fixture
+def adb(database_dsn, monkeypatch):
+    """
+    Фабрика AsyncDatabase тестовой схемы для api.aio: пул привязан к event loop, поэтому каждый asyncio.run()
+    в тесте создаёт свой (adb() внутри корутины) и закрывает его в конце.
+    """
+    from api import aio
+    from api.aiodb import AsyncDatabase
+
+    monkeypatch.setattr(api, "BALANCE_MODE", "trigger")
+
+    def make(**options):
+        database = AsyncDatabase(database_dsn, maxconn=options.pop("maxconn", 5), checkout_timeout=options.pop("checkout_timeout", 2.0), **options)
+        monkeypatch.setattr(aio, "ADB", database)
+        return database
+    return make
+
+
+@pytest.fixture
+def owner(db):
+    """id нового пользователя - у каждого теста свои карты и категории."""
+    return api.add_user(login=f"t_{uuid.uuid4().hex[:20]}", password_hash="hash", password_salt="salt", name="test")
+
+
+def make_subcards(owner_id, cards=1, categories=1):
+    """Карты и категории пользователя owner_id со всеми субкартами; возвращает (card_ids, category_ids)."""
+    category_ids = [api.add_category(owner_id=owner_id, name=f"category_{i}", description="") for i in range(categories)]
+    card_ids = [api.add_card(owner_id=owner_id, name=f"card_{i}", description="") for i in range(cards)]
+    for card_id in card_ids:
+        for category_id in category_ids:
+            api.add_subcard(card_id=card_id, category_id=category_id, description="")
+    return card_ids, category_ids
+
+
+def count_queries(func, *args, **kwargs):
+    """Результат func(*args, **kwargs) и сколько запросов к БД он выполнил (по трассе metrics.QueryTrace)."""
+    token = metrics.begin_trace()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        trace = metrics.end_trace(token)
+    return result, trace.count
+
+
+@pytest.fixture
+def front(db):
+    """Тестовый клиент фронтенда (optymized_front/test_flask.py), вошедший под новым пользователем: (client, owner_id)."""
+    sys.path.insert(0, os.path.join(ROOT, "optymized_front"))
+    try:
+        import test_flask
+    finally:
+        sys.path.remove(os.path.join(ROOT, "optymized_front"))
+    test_flask.app.testing = True
+    client = test_flask.app.test_client()
+    login = f"t_{uuid.uuid4().hex[:20]}"
+    client.post("/register", data={"login": login, "name": "test", "password": "password"})
+    client.post("/login", data={"login": login, "password": "password"})
+    return client, api.get_user_by_login(login).user_id
+
+
+def query_count(response):
+    """Сколько запросов к БД выполнил HTTP запрос - из заголовка Server-Timing фронтенда."""
+    timing = response.headers["Server-Timing"]
+    return int(timing.split('desc="')[1].split(" ")[0])
@@ -0,0 +1,84 @@
+import asyncio
+import uuid
+
+import pytest
+
+from api import aio, records
+from api.db import PoolOverloadedError
+
+
+def run(adb, scenario, **options):
+    """Выполнить scenario(database) в своём event loop с новым пулом aio.ADB и закрыть пул."""
+    async def main():
+        database = adb(**options)
+        try:
+            return await scenario(database)
+        finally:
+            await database.close()
+    return asyncio.run(main())
+
+
+async def make_subcard():
+    owner = await aio.add_user(login=f"t_{uuid.uuid4().hex[:20]}", password_hash="", password_salt="", name="")
+    card_id = await aio.add_card(owner_id=owner, name="card", description="")
+    category_id = await aio.add_category(owner_id=owner, name="category", description="")
+    await aio.add_subcard(card_id=card_id, category_id=category_id, description="")
+    return owner, card_id, category_id
+
+
+def test_concurrent_deposits_and_records(adb):
+    async def scenario(database):
+        owner, card_id, category_id = await make_subcard()
+        results = await asyncio.gather(*(
+            aio.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=1, description="")
+            for _ in range(20)))
+        cards, categories = await asyncio.gather(aio.get_active_cards_by_owner_id(owner), aio.get_active_categories_by_owner_id(owner))
+        return results, cards, categories
+
+    results, cards, categories = run(adb, scenario)
+
+    assert results == [True] * 20
+    assert isinstance(cards[0], records.CardRecord)
+    assert (cards[0].amount, categories[0]["amount"]) == (20, 20)
+
+
+def test_transaction_commits_once_and_rolls_back_swallowed_errors(adb):
+    async def scenario(database):
+        _, card_id, category_id = await make_subcard()
+        async with database.transaction() as tx:
+            await aio.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=5, description="", tx=tx)
+            await aio.dec_money_from_subcard(card_id=card_id, category_id=category_id, dec_amount=2, description="", tx=tx)
+        with pytest.raises(RuntimeError):
+            async with database.transaction() as tx:
+                await aio.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=5, description="", tx=tx)
+                assert not await aio.inc_money_to_subcard(card_id=card_id, category_id=-1, inc_amount=5, description="", tx=tx)
+        return (await aio.get_card_by_id(card_id)).amount
+
+    assert run(adb, scenario) == 3
+
+
+def test_fetch_many_and_stream(adb):
+    async def scenario(database):
+        _, card_id, category_id = await make_subcard()
+        for amount in (1, 2, 3):
+            await aio.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=amount, description="")
+        many = await database.fetch_many([("SELECT 1", None), ("SELECT %(card_id)s::int8", {"card_id": card_id})])
+        streamed = [row.amount async for row in aio.stream_transactions_by_card_id(card_id, batch_size=2)]
+        page, cursor = await aio.get_transactions_page_by_card_id(card_id, page_size=2)
+        return card_id, many, streamed, [row.amount for row in page], cursor
+
+    card_id, many, streamed, page, cursor = run(adb, scenario)
+
+    assert many == [[(1,)], [(card_id,)]]
+    assert streamed == [1, 2, 3]
+    assert page == [3, 2] and cursor is not None
+
+
+def test_pool_overload_is_raised_not_swallowed(adb):
+    async def scenario(database):
+        owner, _, _ = await make_subcard()
+        async with database.transaction(): # единственное соединение пула занято
+            with pytest.raises(PoolOverloadedError):
+                await aio.get_active_cards_by_owner_id(owner)
+
+    run(adb, scenario, maxconn=1, checkout_timeout=0.2)
@@ -0,0 +1,56 @@
+import pytest
+
+from api import api, config
+from api.db import Database
+from conftest import create_schema, drop_schema, make_subcards
+
+
+def test_balance_mode_defaults_to_trigger(monkeypatch):
+    monkeypatch.delenv("SMART_BANKING_DB_BALANCE_MODE", raising=False)
+    monkeypatch.delenv(config.CONFIG_FILE_ENV, raising=False)
+
+    assert config.load_database_config()["balance_mode"] == "trigger"
+
+
+def test_balance_mode_from_environment(monkeypatch):
+    monkeypatch.setenv("SMART_BANKING_DB_BALANCE_MODE", "on_read")
+    assert config.load_database_config()["balance_mode"] == "on_read"
+
+    monkeypatch.setenv("SMART_BANKING_DB_BALANCE_MODE", "on-read")
+    with pytest.raises(ValueError, match="balance_mode"):
+        config.load_database_config()
+
+
+def test_api_reads_balance_mode_once(monkeypatch):
+    monkeypatch.setenv("SMART_BANKING_DB_BALANCE_MODE", "on_read")
+    monkeypatch.setattr(api, "BALANCE_MODE", None)
+
+    assert "sum(s.amount)" in api._card_amount_sql()
+    monkeypatch.setenv("SMART_BANKING_DB_BALANCE_MODE", "trigger")
+    assert api._balance_mode() == "on_read"
+
+
+@pytest.fixture
+def on_read_db(database_dsn, monkeypatch):
+    """Схема с накатанным changeset'ом balance_on_read и api в режиме on_read."""
+    schema, dsn = create_schema(contexts=("balance_on_read",))
+    database = Database(dsn, maxconn=2)
+    monkeypatch.setattr(api, "DB", database)
+    monkeypatch.setattr(api, "BALANCE_MODE", "on_read")
+    yield database
+    for pool in database._pools.values():
+        pool.closeall()
+    drop_schema(schema)
+
+
+def test_on_read_sums_subcards_without_updating_card_rows(on_read_db):
+    owner = api.add_user(login="on_read", password_hash="", password_salt="", name="")
+    (card_id, other_id), (category_id,) = make_subcards(owner, cards=2)
+    api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=10, description="")
+    api.inc_money_to_subcard(card_id=other_id, category_id=category_id, inc_amount=5, description="")
+
+    assert api.get_card_by_id(card_id).amount == 10
+    assert api.get_category_by_id(category_id).amount == 15
+    assert [card.amount for card in api.get_active_cards_overview_by_owner_id(owner)] == [10, 5]
+    # триггер строки card/category больше не трогает - на них и нет конкуренции за блокировку
+    assert on_read_db.fetch_all("SELECT amount FROM card UNION ALL SELECT amount FROM category") == [(0,), (0,), (0,)]
@@ -0,0 +1,119 @@
+import asyncio
+import datetime
+
+import pytest
+
+from api import aio, api
+from api.api import ImportValidationError
+from api.db import _CopyStream
+from conftest import make_subcards
+
+MOMENT = datetime.datetime(2023, 1, 1, 9, 30, tzinfo=datetime.timezone.utc)
+
+
+def balances(card_ids, category_id):
+    return [api.get_subcard_by_card_id_and_category_id(card_id=card_id, category_id=category_id).amount for card_id in card_ids]
+
+
+def test_copy_stream_escapes_and_honours_read_size():
+    stream = _CopyStream([(1, None, "a\tb\\c\nd"), (2, MOMENT, "")])
+    expected = b"1\t\\N\ta\\tb\\\\c\\nd\n2\t2023-01-01 09:30:00+00:00\t\n"
+
+    chunks = []
+    while True:
+        chunk = stream.read(5)
+        if not chunk:
+            break
+        assert len(chunk) <= 5
+        chunks.append(chunk)
+
+    assert b"".join(chunks) == expected
+
+
+def test_import_applies_rows_to_balances_and_log(owner):
+    (card_id, other_id), (category_id,) = make_subcards(owner, cards=2)
+    api.get_card_by_id(card_id) # строка в кэше должна сброситься после импорта
+    rows = [
+        (MOMENT, None, None, card_id, category_id, 100, "salary\twith tab"),
+        (None, card_id, category_id, other_id, category_id, 30, None),
+        (MOMENT, card_id, category_id, None, None, 5, "fee"),
+    ]
+
+    summary = api.bulk_import_transactions(iter(rows))
+
+    assert summary["rows"] == 3
+    assert balances([card_id, other_id], category_id) == [65, 30]
+    assert api.get_card_by_id(card_id).amount == 65
+    logged = sorted(api.get_all_transactions_by_card_id(card_id), key=lambda t: t.amount)
+    assert [(t.amount, t.description) for t in logged] == [(5, "fee"), (30, None), (100, "salary\twith tab")]
+    assert logged[0].timestamptz == MOMENT
+
+
+def test_invalid_rows_raise_import_validation_error_and_load_nothing(owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+    rows = [
+        (None, None, None, card_id, category_id, 10, "ok"),
+        (None, None, None, card_id, -1, 10, "no subcard"),
+        (None, None, None, card_id, category_id, 0, "zero"),
+        (None, None, None, None, None, 10, "nowhere"),
+    ]
+
+    with pytest.raises(ImportValidationError) as error:
+        api.bulk_import_transactions(rows)
+
+    assert error.value.errors == [
+        (2, "subcard_to not found"),
+        (3, "amount must be positive"),
+        (4, "neither subcard_from nor subcard_to is set"),
+    ]
+    assert "line 2: subcard_to not found" in str(error.value)
+    assert balances([card_id], category_id) == [0]
+    assert api.get_all_transactions_by_card_id(card_id) == []
+
+
+def test_errors_are_limited(owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+    rows = [(None, None, None, card_id, category_id, -1, "") for _ in range(api.IMPORT_ERRORS_LIMIT + 5)]
+
+    with pytest.raises(ImportValidationError) as error:
+        api.bulk_import_transactions(rows)
+
+    assert len(error.value.errors) == api.IMPORT_ERRORS_LIMIT
+
+
+def test_invalid_rows_roll_back_callers_transaction(db, owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+
+    with pytest.raises(ImportValidationError):
+        with db.transaction() as tx:
+            api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=7, description="", tx=tx)
+            api.bulk_import_transactions([(None, None, None, card_id, category_id, 0, "")], tx=tx)
+
+    assert balances([card_id], category_id) == [0]
+
+
+def test_malformed_row_returns_none(owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+
+    assert api.bulk_import_transactions([(None, None, None, card_id, category_id, "ten", "")]) is None
+    assert balances([card_id], category_id) == [0]
+
+
+def test_async_import_reports_invalid_rows(adb, owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+
+    async def scenario():
+        database = adb()
+        try:
+            ok = await aio.bulk_import_transactions([(None, None, None, card_id, category_id, 10, "")])
+            with pytest.raises(ImportValidationError) as error:
+                await aio.bulk_import_transactions([(None, None, None, card_id, -1, 10, "")])
+            return ok, error.value.errors
+        finally:
+            await database.close()
+
+    ok, errors = asyncio.run(scenario())
+
+    assert ok["rows"] == 1
+    assert errors == [(1, "subcard_to not found")]
+    assert balances([card_id], category_id) == [10]
@@ -0,0 +1,109 @@
+import threading
+
+from api import api, cache
+from api.cache import TTLCache
+from conftest import count_queries, make_subcards
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    entries = TTLCache(maxsize=10, ttl=5)
+    entries.put("a", 1)
+
+    clock.now += 4.9
+    assert entries.get("a") == 1
+    clock.now += 0.2
+    assert entries.get("a") is None
+    assert entries.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    entries = TTLCache(maxsize=2, ttl=60)
+    entries.put("a", 1)
+    entries.put("b", 2)
+    entries.get("a")
+    entries.put("c", 3)
+
+    assert (entries.get("a"), entries.get("b"), entries.get("c")) == (1, None, 3)
+    assert entries.stats()["evictions"] == 1
+
+
+def test_none_is_not_cached_and_stats_count_hits():
+    entries = TTLCache(maxsize=2, ttl=60)
+    entries.put("a", None)
+    entries.put("b", 2)
+    entries.get("a")
+    entries.get("b")
+    entries.invalidate("b")
+    entries.get("b")
+
+    stats = entries.stats()
+    assert (stats["size"], stats["hits"], stats["misses"]) == (0, 1, 2)
+    assert stats["hit_ratio"] == 1 / 3
+
+
+def test_getter_is_served_from_cache_until_write(owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+
+    card, queries = count_queries(api.get_card_by_id, card_id)
+    assert queries == 1
+    cached, queries = count_queries(api.get_card_by_id, str(card_id)) # id из URL - строкой
+    assert (cached, queries) == (card, 0)
+
+    api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=4, description="")
+    card, queries = count_queries(api.get_card_by_id, card_id)
+    assert (card.amount, queries) == (4, 1)
+
+
+def test_missing_row_is_not_cached(db):
+    assert count_queries(api.get_card_by_id, -1) == (None, 1)
+    assert count_queries(api.get_card_by_id, -1) == (None, 1)
+
+
+def test_put_is_skipped_after_invalidate_or_clear():
+    entries = TTLCache(maxsize=10, ttl=60)
+    generation = entries.generation("a")
+    entries.invalidate("a")
+    entries.put("a", "old", generation)
+    assert entries.get("a") is None
+
+    generation = entries.generation("a")
+    entries.clear()
+    entries.put("a", "old", generation)
+    assert entries.get("a") is None
+
+    entries.put("a", "new", entries.generation("a"))
+    assert entries.get("a") == "new"
+
+
+def test_row_read_before_invalidate_is_not_cached():
+    entries = TTLCache(maxsize=10, ttl=60)
+    read, release = threading.Event(), threading.Event()
+    balance = {"amount": 10}
+
+    @api.cached_by_id(entries)
+    def get_row(entity_id, tx=None):
+        row = (entity_id, balance["amount"])
+        read.set()
+        release.wait(5) # поток A прочитал строку, но ещё не положил её в кэш
+        return row
+
+    reader = threading.Thread(target=get_row, args=(1,))
+    reader.start()
+    assert read.wait(5)
+    balance["amount"] = 20 # поток B: запись и сброс кэша
+    api._invalidate(entries, [1])
+    release.set()
+    reader.join(5)
+
+    assert entries.get(1) is None
+    assert get_row(1) == (1, 20)
@@ -0,0 +1,37 @@
+from api import api
+from conftest import make_subcards, query_count
+
+
+def test_overview_returns_cards_with_their_active_subcards(owner):
+    (card_id,), (food_id, books_id) = make_subcards(owner, cards=1, categories=2)
+    empty_card_id = api.add_card(owner_id=owner, name="empty", description="")
+    deleted_card_id = api.add_card(owner_id=owner, name="deleted", description="")
+    api.delete_card_by_id(deleted_card_id)
+    books_subcard = api.get_subcard_by_card_id_and_category_id(card_id=card_id, category_id=books_id)
+    api.deactivate_subcard_by_id(books_subcard.subcard_id)
+    api.inc_money_to_subcard(card_id=card_id, category_id=food_id, inc_amount=100, description="")
+
+    rows = api.get_active_cards_overview_by_owner_id(owner)
+
+    assert [(row.card_id, row.category_id, row.category_name) for row in rows] == [
+        (card_id, food_id, "category_0"),
+        (empty_card_id, None, None),
+    ]
+    assert rows[0].amount == rows[0].subcard_amount == 100
+
+
+def test_cards_page_query_count_does_not_grow_with_cards(front):
+    client, owner_id = front
+    make_subcards(owner_id, cards=1, categories=2)
+    client.get("/cards") # user_loader кэширует пользователя на первом запросе
+    one_card = query_count(client.get("/cards"))
+
+    for i in range(5):
+        card_id = api.add_card(owner_id=owner_id, name=f"more_{i}", description="")
+        for category in api.get_active_categories_by_owner_id(owner_id):
+            api.add_subcard(card_id=card_id, category_id=category.category_id, description="")
+    response = client.get("/cards")
+
+    assert response.status_code == 200
+    assert "more_4" in response.get_data(as_text=True)
+    assert query_count(response) == one_card
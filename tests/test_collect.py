@@ -0,0 +1,36 @@
+from api import api
+from conftest import make_subcards
+
+
+def subcard_amount(card_id, category_id):
+    return api.get_subcard_by_card_id_and_category_id(card_id=card_id, category_id=category_id).amount
+
+
+def test_collect_moves_positive_balances_of_category_to_target(owner):
+    (target_id, first_id, second_id, empty_id, deleted_id), (category_id,) = make_subcards(owner, cards=5)
+    for card_id, amount in ((target_id, 5), (first_id, 10), (second_id, 20), (deleted_id, 40)):
+        api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=amount, description="")
+    api.delete_card_by_id(deleted_id)
+
+    summary = api.collect_category_money_on_one_subcard(card_id=target_id, category_id=category_id)
+
+    assert summary == [(first_id, 10), (second_id, 20)]
+    assert subcard_amount(target_id, category_id) == 35
+    assert [subcard_amount(card_id, category_id) for card_id in (first_id, second_id, empty_id, deleted_id)] == [0, 0, 0, 40]
+    logged = api.get_all_transactions_by_card_id(target_id)
+    assert sorted((t.card_id_from, t.amount) for t in logged if t.card_id_from is not None) == [(first_id, 10), (second_id, 20)]
+
+
+def test_collect_with_nothing_to_move_returns_empty_list(owner):
+    (target_id, _), (category_id,) = make_subcards(owner, cards=2)
+
+    assert api.collect_category_money_on_one_subcard(card_id=target_id, category_id=category_id) == []
+
+
+def test_collect_without_target_subcard_moves_nothing(owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+    api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=10, description="")
+    target_id = api.add_card(owner_id=owner, name="no_subcards", description="")
+
+    assert api.collect_category_money_on_one_subcard(card_id=target_id, category_id=category_id) is None
+    assert subcard_amount(card_id, category_id) == 10
@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+from api import config
+from api.db import Database, LazyInstance
+
+
+@pytest.fixture
+def clean_env(monkeypatch):
+    for name in list(os.environ):
+        if name.startswith(config.ENV_PREFIX) or name == config.CONFIG_FILE_ENV:
+            monkeypatch.delenv(name)
+    return monkeypatch
+
+
+def test_environment_overrides_file_overrides_defaults(clean_env, tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text(json.dumps({"dsn": "postgresql://file/db", "maxconn": 20, "read_retries": 5}), encoding="utf-8")
+    clean_env.setenv(config.CONFIG_FILE_ENV, str(path))
+    clean_env.setenv("SMART_BANKING_DB_MAXCONN", "30")
+    clean_env.setenv("SMART_BANKING_DB_CHECKOUT_TIMEOUT", "0.5")
+    clean_env.setenv("SMART_BANKING_DB_PREPARE_STATEMENTS", "off")
+    clean_env.setenv("SMART_BANKING_DB_READ_DSN", "")
+
+    settings = config.load_database_config()
+
+    assert settings["dsn"] == "postgresql://file/db"
+    assert (settings["maxconn"], settings["read_retries"], settings["minconn"]) == (30, 5, config.DEFAULTS["minconn"])
+    assert settings["checkout_timeout"] == 0.5
+    assert settings["prepare_statements"] is False
+    assert settings["read_dsn"] is None
+
+
+def test_unknown_file_key_is_rejected(clean_env, tmp_path):
+    path = tmp_path / "db.json"
+    path.write_text(json.dumps({"max_conn": 20}), encoding="utf-8")
+
+    with pytest.raises(ValueError, match="max_conn"):
+        config.load_database_config(str(path))
+
+
+def test_database_does_not_connect_until_first_query():
+    database = Database("postgresql://nobody@127.0.0.1:1/none", connect_timeout=1)
+
+    assert database.pool_stats() == {}
+
+
+def test_lazy_instance_resolves_on_attribute_access():
+    class Singleton:
+        created = 0
+
+        @classmethod
+        def instance(cls):
+            cls.created += 1
+            return cls
+
+        value = 42
+
+    lazy = LazyInstance(Singleton)
+    assert Singleton.created == 0
+    assert lazy.value == 42
+    assert Singleton.created == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_child_opens_its_own_connections(db):
+    parent_pid = db.fetch_one("SELECT pg_backend_pid()")[0]
+
+    child = os.fork()
+    if child == 0:
+        code = 1
+        try:
+            code = 0 if db.fetch_one("SELECT pg_backend_pid()")[0] != parent_pid else 2
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(child, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert db.fetch_one("SELECT pg_backend_pid()")[0] == parent_pid # соединение родителя не закрыто потомком
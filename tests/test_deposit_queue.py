@@ -0,0 +1,139 @@
+import threading
+
+import pytest
+
+from api import api
+from api.db import PoolOverloadedError
+from api.ingest import DepositQueue, DepositQueueFullError
+from conftest import make_subcards
+
+
+class FakeDeposits:
+    """Подмена api.inc_money_to_subcards: запоминает пачки; пока gate закрыт, воркер стоит на первой пачке."""
+
+    def __init__(self, result=lambda batch: [True] * len(batch)):
+        self.result = result
+        self.batches = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, batch):
+        self.batches.append(batch)
+        self.started.set()
+        self.gate.wait(5)
+        return self.result(batch)
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    def make(**options):
+        fake = FakeDeposits(**options)
+        monkeypatch.setattr(api, "inc_money_to_subcards", fake)
+        return fake
+    return make
+
+
+def blocked(fake, deposits):
+    """Занять воркер первой пачкой, чтобы следующие зачисления копились в очереди."""
+    fake.gate.clear()
+    first = deposits.submit(1, 1, 1)
+    assert fake.started.wait(5)
+    return first
+
+
+def test_deposits_accumulated_during_commit_go_in_one_batch(fake):
+    fake = fake()
+    with DepositQueue() as deposits:
+        first = blocked(fake, deposits)
+        futures = [deposits.submit(2, 1, amount, "salary") for amount in range(1, 6)]
+        fake.gate.set()
+
+        assert first.result(5) is True
+        assert [future.result(5) for future in futures] == [True] * 5
+
+    assert fake.batches == [[(1, 1, 1, "")], [(2, 1, amount, "salary") for amount in range(1, 6)]]
+    assert (deposits.batches, deposits.deposits) == (2, 6)
+
+
+def test_batch_size_limits_batch(fake):
+    fake = fake()
+    with DepositQueue(batch_size=2) as deposits:
+        blocked(fake, deposits)
+        futures = [deposits.submit(2, 1, amount) for amount in range(1, 6)]
+        fake.gate.set()
+        [future.result(5) for future in futures]
+
+    assert [len(batch) for batch in fake.batches] == [1, 2, 2, 1]
+
+
+def test_database_error_fails_whole_batch(fake):
+    fake(result=lambda batch: None)
+    with DepositQueue() as deposits:
+        futures = [deposits.submit(1, 1, amount) for amount in (1, 2)]
+        assert [future.result(5) for future in futures] == [False, False]
+
+
+def test_overload_is_passed_to_futures(fake):
+    def overloaded(batch):
+        raise PoolOverloadedError("pool is exhausted")
+
+    fake(result=overloaded)
+    with DepositQueue() as deposits:
+        future = deposits.submit(1, 1, 1)
+        with pytest.raises(PoolOverloadedError):
+            future.result(5)
+
+    assert deposits.batches == 0
+
+
+def test_full_queue_raises(fake):
+    fake = fake()
+    deposits = DepositQueue(maxsize=1, put_timeout=0)
+    try:
+        blocked(fake, deposits)
+        deposits.submit(2, 1, 1)
+        with pytest.raises(DepositQueueFullError):
+            deposits.submit(3, 1, 1)
+    finally:
+        fake.gate.set()
+        deposits.close(5)
+
+
+def test_cancelled_deposit_is_skipped(fake):
+    fake = fake()
+    with DepositQueue() as deposits:
+        blocked(fake, deposits)
+        cancelled = deposits.submit(2, 1, 1)
+        kept = deposits.submit(3, 1, 1)
+        assert cancelled.cancel()
+        fake.gate.set()
+        assert kept.result(5) is True
+
+    assert fake.batches[1] == [(3, 1, 1, "")]
+
+
+def test_closed_queue_rejects_deposits(fake):
+    fake()
+    deposits = DepositQueue()
+    deposits.close(5)
+
+    with pytest.raises(RuntimeError):
+        deposits.submit(1, 1, 1)
+
+
+def test_bad_deposits_do_not_spoil_batch(owner):
+    (card_id, other_id), (category_id,) = make_subcards(owner, cards=2)
+    with DepositQueue() as deposits:
+        futures = [
+            deposits.submit(card_id, category_id, 10, "salary"),
+            deposits.submit(card_id, category_id, "abc"), # неверная сумма
+            deposits.submit(other_id, -1, 5), # нет субкарты
+            deposits.submit(card_id, category_id, 0),
+            deposits.submit(other_id, category_id, 7, "salary"),
+        ]
+        results = [future.result(5) for future in futures]
+
+    assert results == [True, False, False, False, True]
+    assert api.get_card_by_id(card_id).amount == 10
+    assert api.get_card_by_id(other_id).amount == 7
@@ -0,0 +1,32 @@
+from api import api, metrics
+from conftest import make_subcards
+
+
+def test_distribution_deposits_every_category_in_one_statement(owner):
+    (card_id,), (existing_id,) = make_subcards(owner)
+    new_id = api.add_category(owner_id=owner, name="new", description="")
+
+    token = metrics.begin_trace()
+    try:
+        # ключи из json шаблона - строки, одна категория может прийти дважды
+        assert api.inc_money_by_distribution(card_id, {str(existing_id): 30, existing_id: 5, new_id: 15}, "template")
+    finally:
+        trace = metrics.end_trace(token)
+
+    assert trace.count == 1
+    subcards = {s.category_id: s.amount for s in api.get_active_subcards_by_card_id(card_id)}
+    assert subcards == {existing_id: 35, new_id: 15} # недостающая субкарта создана
+    assert api.get_card_by_id(card_id).amount == 50
+    logged = [(t.category_id_to, t.amount, t.description) for t in api.get_all_transactions_by_card_id(card_id)]
+    assert sorted(logged) == [(existing_id, 35, "template"), (new_id, 15, "template")]
+
+
+def test_distribution_is_all_or_nothing(owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+
+    assert not api.inc_money_by_distribution(card_id, {category_id: 10, -1: 5}, "") # нет категории -1
+    assert not api.inc_money_by_distribution(card_id, {category_id: 10, category_id + 1: 0}, "")
+    assert not api.inc_money_by_distribution(card_id, {}, "")
+
+    assert api.get_card_by_id(card_id).amount == 0
+    assert api.get_all_transactions_by_card_id(card_id) == []
@@ -0,0 +1,127 @@
+import json
+
+from api import api
+from api.loader import BatchLoader, RequestLoaders
+from conftest import make_subcards, query_count
+
+
+class FakeBatch:
+    """batch_fn, который отдаёт строки (id, "row <id>") для id из known и запоминает вызовы; failing - ошибка БД (None)."""
+
+    def __init__(self, known):
+        self.known = known
+        self.failing = False
+        self.calls = []
+
+    def __call__(self, ids):
+        self.calls.append(ids)
+        if self.failing:
+            return None
+        return [(entity_id, f"row {entity_id}") for entity_id in ids if entity_id in self.known]
+
+
+def test_wanted_ids_are_loaded_with_the_next_miss():
+    batch = FakeBatch({1, 2, 3})
+    loader = BatchLoader(batch)
+
+    loader.want(["3", 2])
+    assert batch.calls == []
+    assert loader.load("1") == (1, "row 1")
+    assert loader.load(3) == (3, "row 3")
+    assert loader.load_many([2, 1]) == [(2, "row 2"), (1, "row 1")]
+
+    assert batch.calls == [[1, 2, 3]]
+    assert loader.batches == 1
+
+
+def test_missing_id_is_remembered():
+    batch = FakeBatch({1})
+    loader = BatchLoader(batch)
+
+    assert loader.load_many([1, 2]) == [(1, "row 1"), None]
+    assert loader.load(2) is None
+    loader.want([2])
+
+    assert loader.batches == 1
+
+
+def test_database_error_is_not_remembered_as_missing():
+    batch = FakeBatch({1})
+    loader = BatchLoader(batch)
+
+    batch.failing = True
+    assert loader.load(1) is None
+    batch.failing = False
+    assert loader.load(1) == (1, "row 1")
+
+    assert batch.calls == [[1], [1]]
+
+
+def test_primed_rows_skip_the_database():
+    batch = FakeBatch(set())
+    loader = BatchLoader(batch)
+
+    loader.want([5])
+    loader.prime([(5, "primed")])
+
+    assert loader.load(5) == (5, "primed")
+    assert batch.calls == []
+
+
+def test_clear_forgets_rows():
+    batch = FakeBatch({1, 2})
+    loader = BatchLoader(batch)
+    loader.load_many([1, 2])
+
+    loader.clear("1")
+    loader.load(2)
+    loader.load(1)
+    loader.clear()
+    loader.load(2)
+
+    assert batch.calls == [[1, 2], [1], [2]]
+
+
+def test_custom_key_and_id_type():
+    loader = BatchLoader(lambda ids: [{"login": login} for login in ids], key=lambda row: row["login"], id_type=str)
+
+    assert loader.load_many(["a", "b"]) == [{"login": "a"}, {"login": "b"}]
+    assert loader.load("a") == {"login": "a"}
+    assert loader.batches == 1
+
+
+def test_request_loaders_fetch_rows_in_one_query_each(owner):
+    card_ids, category_ids = make_subcards(owner, cards=3, categories=2)
+    loaders = RequestLoaders()
+
+    loaders.cards.want(card_ids)
+    cards = [loaders.cards.load(card_id) for card_id in card_ids]
+    categories = loaders.categories.load_many(category_ids + [-1])
+
+    assert [card.card_id for card in cards] == card_ids
+    assert [category.category_id for category in categories[:-1]] == category_ids
+    assert categories[-1] is None
+    assert (loaders.cards.batches, loaders.categories.batches) == (1, 1)
+
+    api.change_card_by_id(id=card_ids[0], name="renamed", description="")
+    loaders.clear()
+    assert loaders.cards.load(card_ids[0]).card_name == "renamed"
+
+
+def add_templates(owner_id, count, prefix):
+    for i in range(count):
+        category_id = api.add_category(owner_id=owner_id, name=f"{prefix}_{i}", description="")
+        api.add_template(owner_id=owner_id, percents=json.dumps({str(category_id): 100}), description="")
+
+
+def test_templates_page_query_count_does_not_grow_with_templates(front):
+    client, owner_id = front
+    add_templates(owner_id, 1, "first")
+    client.get("/cards") # прогрев: данные пользователя
+    few = query_count(client.get("/templates"))
+
+    add_templates(owner_id, 6, "more")
+    response = client.get("/templates")
+
+    assert response.status_code == 200
+    assert query_count(response) == few
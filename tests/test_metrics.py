@@ -0,0 +1,69 @@
+import pytest
+
+from api import api, metrics
+from api.metrics import Counter, Histogram
+
+
+def test_counter_renders_labels_escaped():
+    counter = Counter("test_total", "Test counter.", ["pool"])
+    counter.inc('wr"ite')
+    counter.inc('wr"ite', amount=2)
+
+    assert counter.render() == [
+        "# HELP test_total Test counter.",
+        "# TYPE test_total counter",
+        'test_total{pool="wr\\"ite"} 3.0',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Test histogram.", ["pool"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "write")
+
+    lines = histogram.render()[2:]
+
+    assert lines == [
+        'test_seconds_bucket{pool="write",le="0.1"} 2',
+        'test_seconds_bucket{pool="write",le="1.0"} 3',
+        'test_seconds_bucket{pool="write",le="+Inf"} 4',
+        'test_seconds_sum{pool="write"} 3.65',
+        'test_seconds_count{pool="write"} 4',
+    ]
+
+
+def observed(histogram, *labelvalues):
+    counts, _ = histogram._values.get(labelvalues, ([0], 0.0))
+    return sum(counts)
+
+
+def test_queries_are_labelled_with_api_function(owner):
+    before = observed(metrics.QUERY_SECONDS, "get_active_cards_by_owner_id", "write")
+    checkouts = observed(metrics.POOL_CHECKOUT_SECONDS, "write")
+
+    api.get_active_cards_by_owner_id(owner)
+
+    assert observed(metrics.QUERY_SECONDS, "get_active_cards_by_owner_id", "write") == before + 1
+    assert observed(metrics.POOL_CHECKOUT_SECONDS, "write") == checkouts + 1
+
+
+def test_failed_query_is_counted_as_error():
+    labels = ("unknown", "test")
+    before = metrics.QUERY_ERRORS_TOTAL._values.get(labels, 0)
+
+    with pytest.raises(ZeroDivisionError):
+        with metrics.observe_query("test"):
+            1 / 0
+
+    assert metrics.QUERY_ERRORS_TOTAL._values[labels] == before + 1
+
+
+def test_metrics_endpoint_exposes_pool_and_cache_gauges(front):
+    client, _ = front
+
+    text = client.get("/metrics").get_data(as_text=True)
+
+    assert 'smart_banking_db_pool_maxconn{pool="write"} 5' in text
+    assert 'smart_banking_db_pool_connections{pool="write",state="idle"}' in text
+    assert 'smart_banking_cache_hits_total{cache="user_identity"}' in text
+    assert "# TYPE smart_banking_db_pool_checkout_seconds histogram" in text
@@ -0,0 +1,54 @@
+import pytest
+
+from api import api
+from api.db import Transaction
+from conftest import count_queries, make_subcards
+
+
+def balances(*subcards):
+    return [api.get_subcard_by_card_id_and_category_id(card_id=card_id, category_id=category_id).amount
+            for card_id, category_id in subcards]
+
+
+def test_each_movement_is_one_statement(owner):
+    (card_id, other_id), (category_id,) = make_subcards(owner, cards=2)
+
+    assert count_queries(api.inc_money_to_subcard, card_id=card_id, category_id=category_id, inc_amount=10, description="") == (True, 1)
+    assert count_queries(api.dec_money_from_subcard, card_id=card_id, category_id=category_id, dec_amount=4, description="") == (True, 1)
+    assert count_queries(api.transfer_money_between_subcards, card_id_from=card_id, category_id_from=category_id,
+                         card_id_to=other_id, category_id_to=category_id, change_amount=1, description="") == (True, 1)
+
+    assert balances((card_id, category_id), (other_id, category_id)) == [5, 1]
+    assert len(api.get_all_transactions_by_card_id(card_id)) == 3
+
+
+def test_rejected_movements_change_nothing(owner):
+    (card_id, other_id), (category_id,) = make_subcards(owner, cards=2)
+    api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=10, description="")
+
+    assert not api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=0, description="")
+    assert not api.dec_money_from_subcard(card_id=card_id, category_id=-1, dec_amount=1, description="")
+    assert not api.transfer_money_between_subcards(card_id_from=card_id, category_id_from=category_id,
+                                                   card_id_to=other_id, category_id_to=-1, change_amount=1, description="")
+    assert not api.transfer_money_between_subcards(card_id_from=-1, category_id_from=category_id,
+                                                   card_id_to=other_id, category_id_to=category_id, change_amount=1, description="")
+
+    assert balances((card_id, category_id), (other_id, category_id)) == [10, 0]
+    assert len(api.get_all_transactions_by_card_id(card_id)) == 1
+
+
+@pytest.mark.parametrize("status, error", [(1, ValueError), (2, LookupError), (3, LookupError), (9, RuntimeError)])
+def test_status_codes_raise_and_fail_transaction(status, error):
+    tx = Transaction(cur=None)
+
+    with pytest.raises(error):
+        api._check_money_status((status,), tx)
+    assert tx.failed
+
+
+def test_success_status_leaves_transaction_alone():
+    tx = Transaction(cur=None)
+
+    api._check_money_status((0,), tx)
+
+    assert not tx.failed
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+from psycopg2.pool import PoolError
+
+from api import metrics
+from api.db import BoundedConnectionPool, PoolOverloadedError
+
+
+@pytest.fixture
+def pool(database_dsn):
+    """Пул из одного соединения."""
+    pool = BoundedConnectionPool(1, 1, dsn=database_dsn, timeout=2.0, name="test")
+    yield pool
+    if not pool.closed:
+        pool.closeall()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.001)
+
+
+def test_checkout_gives_up_after_timeout(pool):
+    pool.timeout = 0.05
+    timeouts = metrics.POOL_CHECKOUT_TIMEOUTS_TOTAL._values.get(("test",), 0)
+    conn = pool.getconn()
+
+    with pytest.raises(PoolOverloadedError):
+        pool.getconn()
+
+    assert not pool._waiters
+    assert metrics.POOL_CHECKOUT_TIMEOUTS_TOTAL._values[("test",)] == timeouts + 1
+    pool.putconn(conn)
+    assert pool.getconn() is conn # после таймаута пул по-прежнему исправен
+
+
+def test_waiters_are_served_in_arrival_order(pool):
+    conn = pool.getconn()
+    order, handed = [], []
+
+    def waiter(index):
+        got = pool.getconn()
+        order.append(index)
+        handed.append(got)
+        pool.putconn(got)
+
+    threads = []
+    for index in range(4):
+        threads.append(threading.Thread(target=waiter, args=(index,)))
+        threads[-1].start()
+        wait_for(lambda: len(pool._waiters) == index + 1)
+    pool.putconn(conn)
+    for thread in threads:
+        thread.join(5)
+
+    assert order == [0, 1, 2, 3]
+    assert all(got is conn for got in handed) # соединение передаётся из рук в руки, без переоткрытия
+
+
+def test_new_caller_does_not_overtake_waiters(pool):
+    conn = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    wait_for(lambda: len(pool._waiters) == 1)
+
+    pool.putconn(conn)
+    waiter.join(5)
+    pool.timeout = 0.05
+    with pytest.raises(PoolOverloadedError): # соединение уже у ждавшего
+        pool.getconn()
+    pool.putconn(got[0])
+
+
+def test_closeall_wakes_waiters_with_error(pool):
+    pool.getconn()
+    errors = []
+
+    def waiter():
+        try:
+            pool.getconn()
+        except PoolError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    wait_for(lambda: len(pool._waiters) == 1)
+    pool.closeall()
+    thread.join(5)
+
+    assert len(errors) == 1
+
+
+def test_overload_reaches_front_as_503(front, db, monkeypatch):
+    client, _ = front
+    write_pool = db._get_pool(False)
+    monkeypatch.setattr(write_pool, "timeout", 0.05)
+    held = []
+    with pytest.raises(PoolOverloadedError):
+        while True:
+            held.append(write_pool.getconn())
+
+    try:
+        response = client.get("/cards")
+    finally:
+        for conn in held:
+            write_pool.putconn(conn)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
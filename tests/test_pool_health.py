@@ -0,0 +1,115 @@
+import logging
+import time
+
+import psycopg2
+import pytest
+
+from api import metrics
+from api.db import BoundedConnectionPool, Database
+
+
+def evicted(pool_name, reason):
+    return metrics.POOL_EVICTED_TOTAL._values.get((pool_name, reason), 0)
+
+
+def terminate(database_dsn, conn):
+    """Оборвать соединение со стороны сервера, как при рестарте Postgres."""
+    killer = psycopg2.connect(database_dsn)
+    killer.autocommit = True
+    try:
+        with killer.cursor() as cur:
+            cur.execute("SELECT pg_terminate_backend(%s, 5000)", (conn.info.backend_pid,)) # ждём, пока процесс завершится
+    finally:
+        killer.close()
+
+
+@pytest.fixture
+def make_pool(database_dsn):
+    pools = []
+
+    def make(name, **options):
+        pools.append(BoundedConnectionPool(1, 1, dsn=database_dsn, name=name, **options))
+        return pools[-1]
+    yield make
+    for pool in pools:
+        pool.closeall()
+
+
+def test_terminated_connection_fails_check_and_is_replaced(database_dsn, make_pool):
+    pool = make_pool("health_check", health_check_interval=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    terminate(database_dsn, conn)
+    before = evicted("health_check", "failed_check")
+
+    fresh = pool.getconn()
+
+    assert fresh is not conn and not fresh.closed
+    assert evicted("health_check", "failed_check") == before + 1
+
+
+def test_closed_connection_is_evicted_as_broken(make_pool):
+    pool = make_pool("broken")
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.close()
+    before = evicted("broken", "broken")
+
+    assert pool.getconn() is not conn
+    assert evicted("broken", "broken") == before + 1
+
+
+def test_connection_is_recycled_after_max_lifetime(make_pool):
+    pool = make_pool("lifetime", max_lifetime=0.01)
+    conn = pool.getconn()
+    time.sleep(0.02)
+    before = evicted("lifetime", "expired")
+
+    pool.putconn(conn)
+
+    assert conn.closed
+    assert evicted("lifetime", "expired") == before + 1
+    assert not pool.getconn().closed
+
+
+@pytest.fixture
+def unchecked_db(database_dsn):
+    """Database без проверки соединений перед выдачей - обрыв обнаруживает сам запрос."""
+    database = Database(database_dsn, minconn=1, maxconn=1, health_check_interval=None, retry_backoff=0)
+    yield database
+    database._pool.closeall()
+
+
+def test_readonly_query_is_retried_after_connection_loss(database_dsn, unchecked_db):
+    conn = unchecked_db._pool.getconn()
+    unchecked_db._pool.putconn(conn)
+    terminate(database_dsn, conn)
+    retries = metrics.QUERY_RETRIES_TOTAL._values.get(("unknown", "write"), 0)
+
+    assert unchecked_db.fetch_one("SELECT 1", readonly=True) == (1,)
+    assert metrics.QUERY_RETRIES_TOTAL._values[("unknown", "write")] == retries + 1
+
+
+def test_write_is_not_retried_after_connection_loss(database_dsn, unchecked_db):
+    conn = unchecked_db._pool.getconn()
+    unchecked_db._pool.putconn(conn)
+    terminate(database_dsn, conn)
+
+    with pytest.raises(psycopg2.OperationalError):
+        unchecked_db.execute("SELECT 1")
+    assert unchecked_db.execute("SELECT 1") == 1 # битое соединение пул уже выбросил
+
+
+def test_health_hides_error_details(front, db, monkeypatch, caplog):
+    client, _ = front
+    assert client.get("/health").status_code == 200
+
+    def ping():
+        raise psycopg2.OperationalError('password authentication failed for user "postgres"')
+    monkeypatch.setattr(db, "ping", ping)
+    with caplog.at_level(logging.ERROR, logger="smart_banking.front"):
+        response = client.get("/health")
+
+    assert response.status_code == 503
+    assert "postgres" not in response.get_data(as_text=True)
+    assert "password authentication failed" in caplog.text # причина - в логе сервера
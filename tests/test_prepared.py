@@ -0,0 +1,72 @@
+import pytest
+
+from api.db import Database, _compile_prepared, prepared
+
+PREPARED_NAMES = "SELECT name FROM pg_prepared_statements"
+
+
+def test_named_placeholders_become_positional_parameters():
+    (statement,), execute = _compile_prepared("SELECT %(b)s + %(a)s WHERE %(b)s > 0 AND name LIKE 'x%%'")
+    name, prepare_sql = statement
+
+    assert prepare_sql == f"PREPARE {name} AS SELECT $1 + $2 WHERE $1 > 0 AND name LIKE 'x%'"
+    assert execute == f"EXECUTE {name}(%(b)s, %(a)s);"
+
+
+def test_each_statement_is_prepared_separately():
+    statements, execute = _compile_prepared("UPDATE t SET a = %s WHERE id = %s; SELECT 1;")
+
+    assert [sql.split(" AS ", 1)[1] for _, sql in statements] == ["UPDATE t SET a = $1 WHERE id = $2", "SELECT 1"]
+    first, second = (name for name, _ in statements)
+    assert execute == f"EXECUTE {first}(%s, %s); EXECUTE {second};"
+
+
+def test_same_statement_text_reuses_name():
+    first, _ = _compile_prepared("SELECT %(id)s::int8 AS reused")
+    second, _ = _compile_prepared("  SELECT %(id)s::int8 AS reused  ;")
+
+    assert first == second
+
+
+@pytest.fixture
+def single_connection_db(database_dsn):
+    databases = []
+
+    def make(**options):
+        databases.append(Database(database_dsn, maxconn=1, **options))
+        return databases[-1]
+    yield make
+    for database in databases:
+        database._pool.closeall()
+
+
+def test_prepared_query_runs_through_execute(single_connection_db):
+    database = single_connection_db()
+    sql = prepared("SELECT %(a)s::int + %(b)s::int, %(a)s::int")
+
+    assert database.fetch_one(sql, params={"a": 2, "b": 3}) == (5, 2)
+    assert database.fetch_one(sql, params={"a": 10, "b": 1}) == (11, 10)
+    names = {name for (name,) in database.fetch_all(PREPARED_NAMES)}
+    (name, _), = _compile_prepared(sql)[0]
+    assert name in names
+
+
+def test_prepared_statement_survives_rollback(single_connection_db):
+    database = single_connection_db()
+    sql = prepared("SELECT %(a)s::int * 2")
+
+    with pytest.raises(ZeroDivisionError):
+        with database.transaction() as tx:
+            tx.fetch_one(sql, params={"a": 1})
+            1 / 0
+
+    # на соединении запрос помечен подготовленным - он должен остаться и на сервере
+    assert database.fetch_one(sql, params={"a": 4}) == (8,)
+
+
+def test_prepare_statements_can_be_disabled(single_connection_db):
+    database = single_connection_db(prepare_statements=False)
+    sql = prepared("SELECT %(a)s::int - 1")
+
+    assert database.fetch_one(sql, params={"a": 4}) == (3,)
+    assert database.fetch_all(PREPARED_NAMES) == []
@@ -0,0 +1,56 @@
+import logging
+import sys
+
+from api import api, metrics
+from conftest import make_subcards, query_count
+
+
+def test_trace_counts_time_and_repeats():
+    trace = metrics.QueryTrace()
+    for _ in range(3):
+        trace.record("SELECT *\n  FROM card WHERE id = %(id)s", 0.001)
+    trace.record("SELECT 1", 0.0025)
+
+    assert trace.count == 4
+    assert trace.repeated(2) == [("SELECT * FROM card WHERE id = %(id)s", 3)] # пробелы не различаются
+    assert trace.repeated(3) == []
+    assert trace.server_timing() == 'db;dur=5.5;desc="4 queries"'
+
+
+def test_api_calls_are_recorded_only_inside_trace(owner):
+    (card_id,), _ = make_subcards(owner)
+    api.get_card_by_id(card_id) # вне трассы запросы не записываются и не падают
+
+    token = metrics.begin_trace()
+    try:
+        api.get_active_subcards_by_card_id(card_id)
+        api.get_active_subcards_by_card_id(card_id)
+    finally:
+        trace = metrics.end_trace(token)
+
+    assert trace.count == 2
+    assert metrics.current_trace.get() is None
+
+
+def test_front_reports_server_timing(front):
+    client, _ = front
+
+    response = client.get("/cards")
+
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+    assert query_count(response) > 0
+
+
+def test_front_warns_about_repeated_queries(front, monkeypatch, caplog):
+    client, _ = front
+    test_flask = sys.modules["test_flask"]
+    client.get("/cards")
+
+    with caplog.at_level(logging.WARNING, logger="smart_banking.front"):
+        client.get("/cards")
+        assert not caplog.records
+        monkeypatch.setattr(test_flask, "query_repeat_limit", 0)
+        client.get("/cards")
+
+    assert caplog.records
+    assert all(record.getMessage().startswith("N+1: GET /cards выполнил запрос 1 раз") for record in caplog.records)
@@ -0,0 +1,115 @@
+import uuid
+from urllib.parse import quote
+
+import psycopg2
+import pytest
+
+from api import api
+from api.db import Database, _use_read_pool, begin_read_your_writes, end_read_your_writes
+from conftest import TEST_DSN, make_subcards
+
+APPLICATION_NAME = "SELECT current_setting('application_name')"
+
+
+def test_reads_outside_scope_always_go_to_read_pool():
+    assert _use_read_pool(readonly=True)
+    assert not _use_read_pool(readonly=False)
+    assert _use_read_pool(readonly=True)
+
+
+def test_reads_after_write_in_scope_go_to_primary():
+    token = begin_read_your_writes()
+    try:
+        assert _use_read_pool(readonly=True)
+        assert not _use_read_pool(readonly=False)
+        assert not _use_read_pool(readonly=True)
+    finally:
+        end_read_your_writes(token)
+
+    assert _use_read_pool(readonly=True)
+
+
+@pytest.fixture
+def split_db(database_dsn):
+    """Database, у которой пул чтения отличается от основного application_name соединений."""
+    database = Database(f"{database_dsn}&application_name=primary", read_dsn=f"{database_dsn}&application_name=replica", maxconn=2)
+    yield database
+    for pool in database._pools.values():
+        pool.closeall()
+
+
+def served_by(database, readonly):
+    return database.fetch_one(APPLICATION_NAME, readonly=readonly)[0]
+
+
+def test_readonly_queries_use_read_dsn(split_db):
+    assert served_by(split_db, readonly=True) == "replica"
+    assert served_by(split_db, readonly=False) == "primary"
+    with split_db.transaction() as tx:
+        assert tx.fetch_one(APPLICATION_NAME, readonly=True)[0] == "primary"
+    assert set(split_db.pool_stats()) == {"read", "write"}
+
+
+def test_read_your_writes_scope_pins_reads_to_primary(split_db):
+    token = begin_read_your_writes()
+    try:
+        assert served_by(split_db, readonly=True) == "replica"
+        split_db.execute("SELECT 1") # запись
+        assert served_by(split_db, readonly=True) == "primary"
+    finally:
+        end_read_your_writes(token)
+
+
+def test_without_read_dsn_there_is_one_pool(db):
+    db.fetch_one("SELECT 1", readonly=True)
+
+    assert set(db.pool_stats()) == {"write"}
+
+
+
+@pytest.fixture
+def lagging_db(database_dsn, monkeypatch):
+    """
+    Фабрика api.DB, у которой пул чтения смотрит в "отстающую реплику": схему с копиями таблиц тестовой схемы,
+    снятыми при вызове фабрики (функции и остальное берутся из тестовой схемы по search_path).
+    """
+    conn = psycopg2.connect(database_dsn)
+    conn.autocommit = True
+    replicas, databases = [], []
+
+    def make():
+        replicas.append(f"replica_{uuid.uuid4().hex[:12]}")
+        with conn.cursor() as cur:
+            cur.execute("SELECT current_schema()")
+            schema, = cur.fetchone()
+            cur.execute(f"CREATE SCHEMA {replicas[-1]}")
+            cur.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = %s AND table_type = 'BASE TABLE'", (schema,))
+            for table, in cur.fetchall():
+                cur.execute(f'CREATE TABLE {replicas[-1]}."{table}" AS TABLE {schema}."{table}"')
+        separator = "&" if "?" in TEST_DSN else "?"
+        read_dsn = f"{TEST_DSN}{separator}options={quote(f'-csearch_path={replicas[-1]},{schema}')}"
+        databases.append(Database(database_dsn, read_dsn=read_dsn, maxconn=2))
+        monkeypatch.setattr(api, "DB", databases[-1])
+        return databases[-1]
+    yield make
+    for database in databases:
+        for pool in database._pools.values():
+            pool.closeall()
+    with conn.cursor() as cur:
+        for replica in replicas:
+            cur.execute(f"DROP SCHEMA {replica} CASCADE")
+    conn.close()
+
+
+def test_cache_is_not_filled_from_lagging_replica(owner, lagging_db):
+    (card_id,), (category_id,) = make_subcards(owner)
+    database = lagging_db() # реплика снята после создания карты, но до зачисления
+    api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=10, description="")
+
+    assert database.fetch_one("SELECT amount FROM card WHERE id = %(id)s", params={"id": card_id}, readonly=True) == (0,) # реплика отстаёт
+    assert api.get_card_by_id(card_id).amount == 10
+    assert api.get_category_by_id(category_id).amount == 10
+
+    api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=5, description="")
+    assert api.get_card_by_id(card_id).amount == 15
+    assert api.CARD_CACHE.get(card_id).amount == 15
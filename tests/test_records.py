@@ -0,0 +1,77 @@
+import asyncio
+import pickle
+
+import pytest
+
+from api import aio, api, records
+from conftest import make_subcards
+
+
+def test_record_is_a_tuple_with_mapping_access():
+    card = records.CardRecord(1, 2, "main", 10, True, None)
+
+    assert card["card_name"] == card.card_name == card[2] == "main"
+    assert card[-2:] == (True, None)
+    card_id, owner_id, *_ = card
+    assert (card_id, owner_id) == (1, 2)
+    assert card.get("amount") == 10
+    assert card.get("missing", "default") == "default"
+    assert dict(card.items()) == card._asdict()
+    assert dict(card) == card._asdict() # keys() и [] - dict() принимает запись как словарь
+    assert card == (1, 2, "main", 10, True, None)
+    assert pickle.loads(pickle.dumps(card)) == card
+
+
+def test_record_is_immutable():
+    card = records.CardRecord(1, 2, "main", 10, True, None)
+
+    with pytest.raises(KeyError):
+        card["missing"]
+    with pytest.raises(AttributeError):
+        card.amount = 0
+    with pytest.raises(AttributeError):
+        card.extra = 0 # __slots__ - у записи нет __dict__
+
+
+def test_getters_return_records(owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+    api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=5, description="")
+
+    card = api.get_card_by_id(card_id)
+    assert isinstance(card, records.CardRecord)
+    assert card["amount"] == 5
+    assert isinstance(api.get_category_by_id(category_id), records.CategoryRecord)
+    subcard, = api.get_active_subcards_by_card_id(card_id)
+    assert isinstance(subcard, records.SubcardRecord)
+    transaction, = api.get_all_transactions_by_card_id(card_id)
+    assert isinstance(transaction, records.TransactionRecord)
+    assert transaction["category_id_to"] == category_id
+
+
+def test_async_getters_return_records(adb, owner):
+    (card_id,), _ = make_subcards(owner)
+
+    async def scenario():
+        database = adb()
+        try:
+            return await aio.get_card_by_id(card_id)
+        finally:
+            await database.close()
+
+    card = asyncio.run(scenario())
+
+    assert isinstance(card, records.CardRecord)
+    assert card["card_id"] == card_id
+
+
+def test_edit_card_shows_balance_and_rejects_changes(front):
+    client, owner_id = front
+    (card_id,), (category_id,) = make_subcards(owner_id)
+    api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=42, description="")
+
+    response = client.get(f"/edit_card/{card_id}")
+
+    assert response.status_code == 200
+    assert 'value="42.00"' in response.get_data(as_text=True)
+    assert client.post(f"/edit_card/{card_id}", data={"amount": "1000"}).status_code == 405
+    assert api.get_card_by_id(card_id).amount == 42
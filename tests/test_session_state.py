@@ -0,0 +1,59 @@
+from psycopg2.extensions import ISOLATION_LEVEL_READ_COMMITTED, ISOLATION_LEVEL_SERIALIZABLE
+
+from api.db import Database
+
+
+class FakeConnection:
+    """Соединение, которое только запоминает смену режима сессии."""
+
+    def __init__(self):
+        self._autocommit = False
+        self.isolation_level = ISOLATION_LEVEL_READ_COMMITTED
+        self.calls = []
+
+    @property
+    def autocommit(self):
+        return self._autocommit
+
+    @autocommit.setter
+    def autocommit(self, value):
+        self.calls.append(("autocommit", value))
+        self._autocommit = value
+
+    def set_session(self, isolation_level=None, autocommit=None):
+        self.calls.append(("set_session", isolation_level, autocommit))
+        self.isolation_level = isolation_level
+        self._autocommit = autocommit
+
+
+def test_same_mode_does_not_touch_session():
+    conn = FakeConnection()
+
+    for _ in range(3):
+        Database._apply_isolation(conn, "read_committed")
+
+    assert conn.calls == []
+
+
+def test_mode_changes_only_when_different():
+    conn = FakeConnection()
+
+    Database._apply_isolation(conn, "serializable")
+    Database._apply_isolation(conn, "serializable")
+    Database._apply_isolation(conn, "autocommit")
+    Database._apply_isolation(conn, "autocommit")
+    Database._apply_isolation(conn, "read_committed")
+
+    assert conn.calls == [
+        ("set_session", ISOLATION_LEVEL_SERIALIZABLE, False),
+        ("autocommit", True),
+        ("set_session", ISOLATION_LEVEL_READ_COMMITTED, False),
+    ]
+
+
+def test_pooled_connection_keeps_working_across_modes(db):
+    db.ping() # autocommit
+    assert db.fetch_one("SELECT current_setting('transaction_isolation')", "serializable") == ("serializable",)
+    assert db.fetch_one("SELECT current_setting('transaction_isolation')") == ("read committed",)
+    db.ping()
+    assert db.fetch_one("SELECT 1") == (1,)
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from api import api
+from conftest import make_subcards
+
+
+def deposit(card_id, category_id, times):
+    for amount in range(1, times + 1):
+        api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=amount, description=f"d{amount}")
+
+
+def in_use(db):
+    return db.pool_stats()["write"]["in_use"]
+
+
+def test_stream_yields_whole_history_oldest_first_in_batches(db, owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+    deposit(card_id, category_id, 7)
+    before = in_use(db)
+
+    rows = list(api.stream_transactions_by_card_id(card_id, batch_size=3))
+
+    assert [row.amount for row in rows] == list(range(1, 8))
+    assert [row.transaction_id for row in rows] == sorted(row.transaction_id for row in rows)
+    assert in_use(db) == before # исчерпанный генератор вернул соединение
+
+
+def test_closed_stream_returns_connection(db, owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+    deposit(card_id, category_id, 5)
+    before = in_use(db)
+
+    rows = api.stream_transactions_by_category_id(category_id, batch_size=2)
+    next(rows)
+    assert in_use(db) == before + 1
+    rows.close()
+
+    assert in_use(db) == before
+
+
+def test_stream_requires_transaction(db):
+    with pytest.raises(ValueError):
+        next(db.stream("SELECT 1", isolation="autocommit"))
+
+
+def test_export_endpoints(front):
+    client, owner_id = front
+    (card_id,), (category_id,) = make_subcards(owner_id)
+    deposit(card_id, category_id, 3)
+
+    csv_lines = client.get(f"/cards/{card_id}/transactions.csv").get_data(as_text=True).splitlines()
+    ndjson = client.get(f"/categories/{category_id}/transactions.ndjson").get_data(as_text=True).splitlines()
+
+    assert len(csv_lines) == 4 # заголовок и три строки
+    assert [json.loads(line)["description"] for line in ndjson] == ["d1", "d2", "d3"]
+    assert client.get(f"/cards/{card_id}/transactions.xml").status_code == 404
+
+
+def test_export_of_foreign_card_is_forbidden(front, owner):
+    client, _ = front
+    (card_id,), _ = make_subcards(owner)
+
+    assert client.get(f"/cards/{card_id}/transactions.csv").status_code == 403
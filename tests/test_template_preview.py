@@ -0,0 +1,66 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from api import api
+from conftest import query_count
+
+
+def test_largest_remainder_keeps_total():
+    assert api.distribute_by_percents(7, {1: 50, 2: 25, 3: 25}) == {1: 3, 2: 2, 3: 2}
+    # округление каждой части вниз потеряло бы рубль: 33 + 33 + 33
+    assert api.distribute_by_percents(100, {1: 1, 2: 1, 3: 1}) == {1: 34, 2: 33, 3: 33}
+    assert api.distribute_by_percents(10, {1: 100, 2: 0}) == {1: 10, 2: 0}
+
+
+def test_distribution_in_cents():
+    parts = api.distribute_by_percents(Decimal("10.00"), {1: 1, 2: 1, 3: 1}, unit=Decimal("0.01"))
+
+    assert parts == {1: Decimal("3.34"), 2: Decimal("3.33"), 3: Decimal("3.33")}
+    assert sum(parts.values()) == Decimal("10.00")
+
+
+@pytest.mark.parametrize("percents", [{}, {1: 0}, {1: 50, 2: -10}])
+def test_bad_percents_are_rejected(percents):
+    with pytest.raises(ValueError):
+        api.distribute_by_percents(10, percents)
+
+
+def add_template(front, categories, prefix="category"):
+    client, owner_id = front
+    category_ids = [api.add_category(owner_id=owner_id, name=f"{prefix}_{i}", description="") for i in range(categories)]
+    percents = json.dumps({str(category_id): 100 / categories for category_id in category_ids})
+    return api.add_template(owner_id=owner_id, percents=percents, description=""), category_ids
+
+
+def test_preview_returns_whole_distribution_in_one_response(front):
+    client, _ = front
+    template_id, category_ids = add_template(front, 3)
+
+    response = client.get(f"/templates/{template_id}/preview?amount=100")
+
+    assert response.status_code == 200
+    distribution = response.get_json()["distribution"]
+    assert [part["category_id"] for part in distribution] == category_ids
+    assert [part["category_name"] for part in distribution] == ["category_0", "category_1", "category_2"]
+    assert sum(part["amount"] for part in distribution) == 100
+
+
+def test_preview_query_count_does_not_depend_on_categories(front):
+    client, _ = front
+    small, _ = add_template(front, 2)
+    large, _ = add_template(front, 8, prefix="other")
+    client.get("/cards") # прогрев: данные пользователя
+
+    counts = [query_count(client.get(f"/templates/{template_id}/preview?amount=50")) for template_id in (small, large)]
+
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.parametrize("amount", ["0", "-5", "abc"])
+def test_preview_rejects_non_positive_amount(front, amount):
+    client, _ = front
+    template_id, _ = add_template(front, 2)
+
+    assert client.get(f"/templates/{template_id}/preview?amount={amount}").status_code == 400
@@ -0,0 +1,70 @@
+import inspect
+
+import pytest
+
+from api import aio, api
+from conftest import make_subcards
+
+
+def test_calls_in_transaction_commit_together(db, owner):
+    (card_id,), (category_id,) = make_subcards(owner, cards=1, categories=1)
+    other_category_id = api.add_category(owner_id=owner, name="other", description="")
+
+    with db.transaction() as tx:
+        assert api.add_subcard(card_id=card_id, category_id=other_category_id, description="", tx=tx)
+        assert api.inc_money_to_subcard(card_id=card_id, category_id=other_category_id, inc_amount=7, description="", tx=tx)
+        # внутри транзакции её изменения видны через tx, кэш при этом не читается
+        assert api.get_card_by_id(card_id, tx=tx).amount == 7
+
+    assert api.get_card_by_id(card_id).amount == 7
+
+
+def test_exception_in_block_rolls_back(db, owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+
+    with pytest.raises(KeyError):
+        with db.transaction() as tx:
+            api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=7, description="", tx=tx)
+            raise KeyError("boom")
+
+    assert api.get_card_by_id(card_id).amount == 0
+
+
+def test_swallowed_statement_error_rolls_back_and_raises(db, owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+
+    with pytest.raises(RuntimeError, match="rolled back"):
+        with db.transaction() as tx:
+            assert api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=7, description="", tx=tx)
+            # субкарты нет: декоратор вернёт False, но транзакция уже помечена неудачной
+            assert not api.inc_money_to_subcard(card_id=card_id, category_id=-1, inc_amount=1, description="", tx=tx)
+
+    assert api.get_card_by_id(card_id).amount == 0
+
+
+def test_cache_is_invalidated_after_commit(db, owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+    assert api.get_card_by_id(card_id).amount == 0 # строка в кэше
+
+    with db.transaction() as tx:
+        api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=3, description="", tx=tx)
+
+    assert api.get_card_by_id(card_id).amount == 3
+
+
+def test_autocommit_transaction_is_rejected(db):
+    with pytest.raises(ValueError):
+        with db.transaction("autocommit"):
+            pass
+
+
+@pytest.mark.parametrize("module", [api, aio], ids=["api", "aio"])
+def test_tx_is_keyword_only_next_to_kwargs(module):
+    functions = [func for _, func in inspect.getmembers(module, inspect.isfunction) if func.__module__ == module.__name__]
+    with_kwargs = [func for func in functions
+                   if any(p.kind is inspect.Parameter.VAR_KEYWORD for p in inspect.signature(func).parameters.values())
+                   and "tx" in inspect.signature(func).parameters]
+
+    assert with_kwargs
+    for func in with_kwargs:
+        assert inspect.signature(func).parameters["tx"].kind is inspect.Parameter.KEYWORD_ONLY, func.__name__
@@ -0,0 +1,53 @@
+import datetime
+
+import pytest
+
+from api import api, queries
+from conftest import make_subcards
+
+NOW = datetime.datetime(2024, 5, 1, tzinfo=datetime.timezone.utc)
+
+
+def plan(db, sql, params):
+    # на маленькой тестовой таблице seq scan дешевле любого индекса - запрещаем его, чтобы увидеть доступные индексы
+    with db.transaction() as tx:
+        tx.execute("SET LOCAL enable_seqscan = off")
+        return "\n".join(line for (line,) in tx.fetch_all("EXPLAIN " + sql, params=params))
+
+
+@pytest.mark.parametrize("sql, column, params", [
+    (queries.GET_TIME_BOUND_TRANSACTIONS_BY_CARD_ID, "card_id", {"card_id": 1, "time_from": NOW, "time_to": NOW}),
+    (queries.GET_TIME_BOUND_TRANSACTIONS_BY_CATEGORY_ID, "category_id", {"category_id": 1, "time_from": NOW, "time_to": NOW}),
+    (queries.GET_ALL_TRANSACTIONS_BY_CATEGORY_ID, "category_id", {"category_id": 1}),
+], ids=["card_time_bound", "category_time_bound", "category_all"])
+def test_both_union_branches_use_composite_indexes(db, sql, column, params):
+    text = plan(db, sql, params)
+
+    assert f"transaction_{column}_from_timestamptz_id_idx" in text
+    assert f"transaction_{column}_to_timestamptz_id_idx" in text
+
+
+def test_redundant_single_column_indexes_are_dropped(db):
+    names = {name for (name,) in db.fetch_all("SELECT indexname FROM pg_indexes WHERE tablename = 'transaction' AND schemaname = current_schema()")}
+
+    assert not names & {"transaction_card_id_from_idx", "transaction_card_id_to_idx"}
+
+
+def test_union_queries_return_each_transaction_once(owner):
+    (card_id, other_id), (category_id, other_category_id) = make_subcards(owner, cards=2, categories=2)
+    api.inc_money_to_subcard(card_id=card_id, category_id=category_id, inc_amount=10, description="")
+    api.transfer_money_between_subcards(card_id_from=card_id, category_id_from=category_id, card_id_to=card_id,
+                                        category_id_to=other_category_id, change_amount=3, description="")
+    api.transfer_money_between_subcards(card_id_from=card_id, category_id_from=category_id, card_id_to=other_id,
+                                        category_id_to=category_id, change_amount=2, description="")
+
+    by_card = api.get_all_transactions_by_card_id(card_id)
+    by_category = api.get_all_transactions_by_category_id(category_id)
+    everything = datetime.datetime.now(datetime.timezone.utc)
+    bounded = api.get_time_bound_transactions_by_card_id(card_id=card_id, time_from=everything - datetime.timedelta(hours=1),
+                                                          time_to=everything + datetime.timedelta(hours=1))
+
+    assert sorted(t.amount for t in by_card) == [2, 3, 10]
+    assert sorted(t.amount for t in by_category) == [2, 3, 10] # перевод внутри категории между картами - тоже одна строка
+    assert sorted(t.transaction_id for t in bounded) == sorted(t.transaction_id for t in by_card)
+    assert api.get_time_bound_transactions_by_card_id(card_id=card_id, time_from=NOW, time_to=NOW) == []
@@ -0,0 +1,61 @@
+import datetime
+
+from api import api
+from conftest import make_subcards
+
+SAME_MOMENT = datetime.datetime(2024, 5, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+def log_transaction(db, timestamptz, card_from, category_from, card_to, category_to, amount):
+    return db.fetch_one("""
+        INSERT INTO transaction (timestamptz, card_id_from, category_id_from, card_id_to, category_id_to, amount, description)
+        VALUES (%s, %s, %s, %s, %s, %s, '')
+        RETURNING id
+    """, params=(timestamptz, card_from, category_from, card_to, category_to, amount))[0]
+
+
+def walk(get_page, entity_id, page_size):
+    rows, pages, cursor = [], 0, None
+    while True:
+        page, cursor = get_page(entity_id, page_size=page_size, cursor=cursor)
+        rows.extend(page)
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+def test_pages_split_rows_with_equal_timestamps_without_gaps_or_duplicates(db, owner):
+    (card_id, other_id), (category_id,) = make_subcards(owner, cards=2)
+    earlier = SAME_MOMENT - datetime.timedelta(days=1)
+    expected = [log_transaction(db, earlier, None, None, card_id, category_id, 1)]
+    expected += [log_transaction(db, SAME_MOMENT, None, None, card_id, category_id, 2) for _ in range(5)]
+    expected.append(log_transaction(db, SAME_MOMENT, card_id, category_id, other_id, category_id, 3))
+    expected.append(log_transaction(db, SAME_MOMENT, card_id, category_id, card_id, category_id, 4)) # внутри карты - одна строка
+    log_transaction(db, SAME_MOMENT, None, None, other_id, category_id, 5) # чужая карта
+
+    rows, pages = walk(api.get_transactions_page_by_card_id, card_id, page_size=3)
+
+    # от новых к старым; при равном времени - по убыванию id
+    assert [row.transaction_id for row in rows] == sorted(expected[1:], reverse=True) + expected[:1]
+    assert pages == 3
+
+
+def test_category_pages_and_exact_last_page(db, owner):
+    (card_id,), (category_id,) = make_subcards(owner)
+    expected = [log_transaction(db, SAME_MOMENT, None, None, card_id, category_id, 1) for _ in range(4)]
+
+    rows, pages = walk(api.get_transactions_page_by_category_id, category_id, page_size=2)
+
+    assert [row.transaction_id for row in rows] == expected[::-1]
+    assert pages == 2 # лишняя строка в запросе - курсора после полной последней страницы нет
+
+
+def test_page_cursor_round_trip():
+    row = (42, SAME_MOMENT + datetime.timedelta(microseconds=7))
+
+    assert api._decode_page_cursor(api._encode_page_cursor(row)) == (row[1], 42)
+
+
+def test_page_size_is_bounded(db):
+    assert api.get_transactions_page_by_card_id(1, page_size=0) is None
+    assert api.get_transactions_page_by_card_id(1, page_size=api.TRANSACTIONS_PAGE_SIZE_MAX + 1) is None
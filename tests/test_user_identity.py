@@ -0,0 +1,26 @@
+from api import api
+from conftest import count_queries, query_count
+
+
+def test_identity_has_no_password_fields_and_is_cached(owner):
+    identity, queries = count_queries(api.get_user_identity_by_id, owner)
+
+    assert identity._fields == ("user_id", "login", "name")
+    assert (identity.user_id, identity.name, queries) == (owner, "test", 1)
+    assert count_queries(api.get_user_identity_by_id, str(owner)) == (identity, 0)
+
+
+def test_user_change_invalidates_identity(owner):
+    api.get_user_identity_by_id(owner)
+
+    assert api.change_user_by_id(id=owner, password_hash="h", password_salt="s", name="renamed")
+
+    assert api.get_user_identity_by_id(owner).name == "renamed"
+
+
+def test_logged_in_requests_do_not_load_user_from_database(front):
+    client, _ = front
+    client.get("/cards") # первый запрос загружает пользователя в кэш
+
+    # на странице карт остаётся один запрос - сами карты
+    assert query_count(client.get("/cards")) == 1